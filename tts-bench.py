@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the TTS service
+Starts the service against a fake AnkiConnect and the stub synthesis backend,
+drives its endpoints concurrently and reports latency percentiles and throughput
+"""
+
+import argparse
+import fnmatch
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+import requests
+
+SERVICE_SCRIPT = Path(__file__).with_name('tts-service.py')
+SCENARIOS = ('synthesize', 'add-note', 'copy-audio', 'check-audio')
+MODEL_FIELDS = {
+    'Basic': ['Front', 'Back'],
+    'English Vocabulary': ['Word', 'IPA', 'Meaning', 'Example', 'Audio']
+}
+
+class FakeAnkiConnect:
+    """AnkiConnect stand-in implementing the actions the service uses, with a fixed delay per call"""
+
+    def __init__(self, media_dir, latency=0.0, port=0):
+        self.media_dir = str(media_dir)
+        self.latency = latency
+        self.notes = {}
+        self.next_id = int(time.time() * 1000)  # Anki note IDs are millisecond timestamps
+        self.calls = {}
+        self.lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if fake.latency:
+                    time.sleep(fake.latency)
+                body = fake.call(payload.get('action'), payload.get('params') or {})
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def call(self, action, params):
+        """One action as AnkiConnect answers it: {"result", "error"}"""
+        try:
+            return {"result": self._handle(action, params), "error": None}
+        except Exception as e:
+            return {"result": None, "error": str(e)}
+
+    def _add(self, note):
+        if not note.get('deckName') or note.get('modelName') not in MODEL_FIELDS:
+            raise Exception(f"cannot create note: invalid deck or model in {note}")
+        with self.lock:
+            self.next_id += 1
+            self.notes[self.next_id] = note
+            return self.next_id
+
+    def _handle(self, action, params):
+        with self.lock:
+            self.calls[action] = self.calls.get(action, 0) + 1
+
+        if action == 'version':
+            return 6
+        if action == 'deckNames':
+            return ['Default', 'Benchmark']
+        if action == 'modelNames':
+            return list(MODEL_FIELDS)
+        if action == 'modelFieldNames':
+            if params.get('modelName') not in MODEL_FIELDS:
+                raise Exception(f"model was not found: {params.get('modelName')}")
+            return MODEL_FIELDS[params['modelName']]
+        if action == 'getMediaDirPath':
+            return self.media_dir
+        if action == 'addNote':
+            return self._add(params.get('note', {}))
+        if action == 'addNotes':
+            results = []
+            for note in params.get('notes', []):
+                try:
+                    results.append(self._add(note))
+                except Exception:
+                    results.append(None)
+            return results
+        if action == 'findNotes':
+            query = params.get('query', '')
+            with self.lock:
+                return [
+                    note_id for note_id, note in self.notes.items()
+                    if not query.startswith('deck:') or fnmatch.fnmatch(note['deckName'], query[5:].strip('"'))
+                ]
+        if action == 'notesInfo':
+            with self.lock:
+                return [
+                    {
+                        "noteId": note_id,
+                        "modelName": self.notes[note_id]['modelName'],
+                        "tags": self.notes[note_id].get('tags', []),
+                        "fields": {
+                            name: {"value": value, "order": order}
+                            for order, (name, value) in enumerate(self.notes[note_id]['fields'].items())
+                        }
+                    } if note_id in self.notes else {}
+                    for note_id in params.get('notes', [])
+                ]
+        if action in ('updateNoteFields', 'updateNote'):
+            note = params.get('note', {})
+            with self.lock:
+                if note.get('id') not in self.notes:
+                    raise Exception(f"Note was not found: {note.get('id')}")
+                self.notes[note['id']]['fields'].update(note.get('fields') or {})
+                if 'tags' in note:
+                    self.notes[note['id']]['tags'] = note['tags']
+            return None
+        if action == 'deleteNotes':
+            with self.lock:
+                for note_id in params.get('notes', []):
+                    self.notes.pop(note_id, None)
+            return None
+        if action == 'deleteMediaFile':
+            path = os.path.join(self.media_dir, os.path.basename(params.get('filename', '')))
+            if os.path.isfile(path):
+                os.unlink(path)
+            return None
+        if action == 'guiBrowse':
+            return [int(term[4:]) for term in params.get('query', '').split(' or ') if term.startswith('nid:')]
+        if action == 'multi':
+            return [self.call(item.get('action'), item.get('params') or {}) for item in params.get('actions', [])]
+        raise Exception(f"unsupported action: {action}")
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-anki", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def write_test_audio(directory, count, seconds=1.0, rate=16000):
+    """Create count short WAV files for the media scenarios and return their names"""
+    directory.mkdir(parents=True, exist_ok=True)
+    names = []
+    for index in range(count):
+        name = f"bench-{index:04d}.wav"
+        with wave.open(str(directory / name), 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(rate)
+            wav.writeframes(bytes([index % 256, 0]) * int(rate * seconds))
+        names.append(name)
+    return names
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_service(port, anki_url, workdir, args):
+    """Launch tts-service.py on the stub backend and wait until it reports ready"""
+    env = dict(
+        os.environ,
+        ANKI_CONNECT_URL=anki_url,
+        TTS_BACKEND=args.backend,
+        TTS_ENABLE_STUB='1',
+        TTS_STUB_DELAY_MS=str(args.stub_delay_ms),
+        TTS_CACHE_DIR=str(workdir / 'cache'),
+        HEALTH_PROBE_INTERVAL='1'
+    )
+    log = open(workdir / 'service.log', 'wb')
+    process = subprocess.Popen(
+        [sys.executable, str(SERVICE_SCRIPT), '--host', '127.0.0.1', '--port', str(port)],
+        env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + args.startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Service exited with {process.returncode}, see {workdir / 'service.log'}")
+        try:
+            health = requests.get(f"{url}/health", timeout=2).json()
+            if health.get('state') == 'ready' and health.get('anki_available'):
+                return process, url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"Service not ready after {args.startup_timeout}s, see {workdir / 'service.log'}")
+
+def build_request(scenario, index, context, args):
+    """(method, path, json body) for request number index of a scenario"""
+    audio = context['audio_files'][index % len(context['audio_files'])]
+    if scenario == 'synthesize':
+        body = {"text": f"benchmark word {index % args.unique_texts}", "format": args.format}
+        if args.backend:
+            body["backend"] = args.backend
+        return 'POST', '/synthesize', body
+    if scenario == 'add-note':
+        return 'POST', '/anki/add-note', {
+            "deck": "Benchmark",
+            "noteType": "Basic",
+            "fields": {"Front": f"benchmark {index}", "Back": f"[sound:{audio}]"},
+            "tags": ["benchmark"],
+            "existingAudioFiles": {"Back": {"filename": audio}},
+            "vaultPath": context['vault']
+        }
+    if scenario == 'copy-audio':
+        return 'POST', '/anki/copy-audio', {"filename": audio, "vaultPath": context['vault']}
+    if scenario == 'check-audio':
+        return 'GET', f"/anki/check-audio/{audio}", None
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def run_scenario(url, scenario, concurrency, total, context, args):
+    """Send total requests from concurrency threads and summarise their latency"""
+    local = threading.local()
+
+    def send(index):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        method, path, body = build_request(scenario, index, context, args)
+        started = time.perf_counter()
+        try:
+            response = local.session.request(method, url + path, json=body, timeout=args.timeout)
+            response.content  # Include the body transfer
+            ok = response.ok
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - started, ok
+
+    # Warm connections and caches without counting them
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(min(args.warmup, total))))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, ok in results if ok)
+    errors = sum(1 for _, ok in results if not ok)
+    ms = lambda value: round(value * 1000, 2) if value is not None else None
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 1) if elapsed else None,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "max_ms": ms(latencies[-1]) if latencies else None
+    }
+
+def print_report(results):
+    columns = ('scenario', 'concurrency', 'requests', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+    widths = {column: max(len(column), *(len(str(result[column])) for result in results)) for column in columns}
+    print('  '.join(column.ljust(widths[column]) for column in columns))
+    for result in results:
+        print('  '.join(str(result[column]).ljust(widths[column]) for column in columns))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the TTS service with a fake AnkiConnect")
+    parser.add_argument('--url', help="Benchmark a running service instead of starting one (its Anki must be reachable)")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated scenarios (default: {','.join(SCENARIOS)})")
+    parser.add_argument('--concurrency', default='1,8',
+                        help="Comma-separated concurrency levels to run each scenario at (default: 1,8)")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per scenario and level (default: 200)")
+    parser.add_argument('--warmup', type=int, default=10, help="Uncounted requests before each run (default: 10)")
+    parser.add_argument('--backend', default='stub', help="Synthesis backend to use (default: stub)")
+    parser.add_argument('--stub-delay-ms', type=float, default=0, help="Simulated render time of the stub backend")
+    parser.add_argument('--anki-latency-ms', type=float, default=5, help="Delay of every fake AnkiConnect call (default: 5)")
+    parser.add_argument('--unique-texts', type=int, default=50,
+                        help="Distinct texts cycled through by /synthesize; fewer means more cache hits (default: 50)")
+    parser.add_argument('--audio-files', type=int, default=20, help="Vault audio files for the media scenarios (default: 20)")
+    parser.add_argument('--format', default='wav', help="Audio format requested from /synthesize (default: wav)")
+    parser.add_argument('--timeout', type=float, default=60, help="Per-request timeout in seconds")
+    parser.add_argument('--startup-timeout', type=float, default=60, help="Seconds to wait for the service to be ready")
+    parser.add_argument('--json', metavar='PATH', help="Also write the results as JSON")
+    parser.add_argument('--keep-temp', action='store_true', help="Keep the temporary vault, media folder and service log")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(',') if scenario.strip()]
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            sys.exit(f"Unknown scenario: {scenario} (use {', '.join(SCENARIOS)})")
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    workdir = Path(tempfile.mkdtemp(prefix='tts-bench-'))
+    anki = None
+    service = None
+    try:
+        vault = workdir / 'vault'
+        context = {"vault": str(vault), "audio_files": write_test_audio(vault / 'Audio', max(1, args.audio_files))}
+
+        if args.url:
+            url = args.url.rstrip('/')
+        else:
+            media_dir = workdir / 'anki-media'
+            media_dir.mkdir()
+            anki = FakeAnkiConnect(media_dir, args.anki_latency_ms / 1000).start()
+            service, url = start_service(free_port(), anki.url, workdir, args)
+            print(f"Service on {url}, fake AnkiConnect on {anki.url} ({args.anki_latency_ms} ms per call)")
+
+        results = []
+        for scenario in scenarios:
+            for concurrency in levels:
+                results.append(run_scenario(url, scenario, concurrency, args.requests, context, args))
+                print(f"  {scenario} x{concurrency}: {results[-1]['rps']} req/s, p95 {results[-1]['p95_ms']} ms")
+
+        print()
+        print_report(results)
+        if anki:
+            print(f"\nFake AnkiConnect calls: {json.dumps(anki.calls, sort_keys=True)}")
+        if args.json:
+            with open(args.json, 'w') as output:
+                json.dump({"settings": vars(args), "results": results}, output, indent=2)
+    finally:
+        if service:
+            service.terminate()
+            try:
+                service.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                service.kill()
+        if anki:
+            anki.stop()
+        if args.keep_temp:
+            print(f"Temporary files kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
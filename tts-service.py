@@ -4,50 +4,1338 @@ Enhanced TTS Service with Anki Integration
 Supports audio generation and Anki Connect operations
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g, has_request_context
 from flask_cors import CORS
-import pyttsx3
 import io
 import tempfile
 import os
 import requests
 import json
+import re
+import struct
+import wave
 import shutil
+import subprocess
+import sys
+import hashlib
+import heapq
+import bisect
+import contextlib
+import itertools
+import threading
+import uuid
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, CancelledError, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict, deque
 from pathlib import Path
 import time
+import base64
 import logging
 
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Audio post-processing is skipped without numpy
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Synthesis workers re-import this module under the spawn start method (Windows, macOS)
+IS_MAIN_PROCESS = multiprocessing.current_process().name == 'MainProcess'
+
 app = Flask(__name__)
 CORS(app, origins=["app://obsidian.md", "capacitor://localhost", "http://localhost"])
 
-# Initialize TTS engine
-try:
-    tts_engine = pyttsx3.init()
-    # Set voice properties
-    voices = tts_engine.getProperty('voices')
-    if voices:
-        # Try to set English voice
+# Metrics settings
+METRICS_ENABLED = os.environ.get('TTS_METRICS', '1').lower() not in ('0', 'false', 'no', 'off')
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Latency histogram with Prometheus' default-style buckets"""
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(METRICS_BUCKETS) + 1)  # Last bucket is +Inf
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(METRICS_BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+class PhaseTimer:
+    """Times one phase of a request, for the phase histogram and the Server-Timing header"""
+    __slots__ = ('metrics', 'name', 'started')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        if has_request_context():
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            phases = g.get('metric_phases')
+            if phases is not None:
+                phases[self.name] = phases.get(self.name, 0.0) + elapsed
+        else:
+            route = 'background'
+        self.metrics.observe('phases', (route, self.name), elapsed)
+        return False
+
+class Metrics:
+    """Per-route and per-phase latency histograms, exported in Prometheus text format"""
+
+    NO_TIMER = contextlib.nullcontext()
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {'requests': {}, 'phases': {}}  # kind -> labels -> Histogram
+
+    def phase(self, name):
+        """Context manager timing a named phase; a shared no-op when metrics are off"""
+        return PhaseTimer(self, name) if self.enabled else self.NO_TIMER
+
+    def observe(self, kind, labels, seconds):
+        with self.lock:
+            histogram = self.histograms[kind].get(labels)
+            if histogram is None:
+                histogram = self.histograms[kind][labels] = Histogram()
+            histogram.observe(seconds)
+
+    @staticmethod
+    def _labels(**labels):
+        escaped = (
+            f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+            for name, value in labels.items()
+        )
+        return ','.join(escaped)
+
+    def _histogram_lines(self, metric, help_text, label_names, histograms):
+        lines = [f"# HELP {metric} {help_text}", f"# TYPE {metric} histogram"]
+        for labels, (counts, total) in sorted(histograms.items()):
+            label_text = self._labels(**dict(zip(label_names, labels)))
+            cumulative = 0
+            for bound, count in zip(METRICS_BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label_text}}} {total:.6f}")
+            lines.append(f"{metric}_count{{{label_text}}} {cumulative}")
+        return lines
+
+    def render(self, samples=()):
+        """Prometheus text exposition of the histograms plus (name, help, type, value) samples"""
+        with self.lock:
+            # Copy so a scrape never sees a half-updated histogram
+            snapshot = {
+                kind: {labels: (list(histogram.counts), histogram.sum) for labels, histogram in histograms.items()}
+                for kind, histograms in self.histograms.items()
+            }
+        
+        lines = self._histogram_lines(
+            'tts_request_duration_seconds', 'HTTP request latency by route',
+            ('route', 'method', 'status'), snapshot['requests']
+        )
+        lines += self._histogram_lines(
+            'tts_phase_duration_seconds', 'Time spent in each phase of a request',
+            ('route', 'phase'), snapshot['phases']
+        )
+        for name, help_text, metric_type, value in samples:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}", f"{name} {value}"]
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics(METRICS_ENABLED)
+
+if METRICS_ENABLED:
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+        g.metric_phases = {}
+
+    @app.after_request
+    def record_request_timing(response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.observe('requests', (route, request.method, str(response.status_code)), elapsed)
+        
+        timings = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in g.metric_phases.items()]
+        timings.append(f"total;dur={elapsed * 1000:.2f}")
+        response.headers['Server-Timing'] = ', '.join(timings)
+        return response
+
+# TTS settings
+TTS_VOLUME = 0.9
+QUALITY_RATES = {'high': 160, 'medium': 180, 'low': 200}
+
+# Output formats; anything but WAV is encoded by ffmpeg in the synthesis workers
+TTS_FFMPEG = os.environ.get('TTS_FFMPEG') or shutil.which('ffmpeg')
+AUDIO_FORMATS = {
+    'wav': {"mimetype": "audio/wav", "extension": "wav", "codec": None, "muxer": None, "bitrate": None},
+    'mp3': {"mimetype": "audio/mpeg", "extension": "mp3", "codec": "libmp3lame", "muxer": "mp3", "bitrate": 64,
+            # No ID3/Xing headers, so streamed segments concatenate into one clean MP3
+            "options": ['-id3v2_version', '0', '-write_xing', '0']},
+    'ogg': {"mimetype": "audio/ogg", "extension": "ogg", "codec": "libvorbis", "muxer": "ogg", "bitrate": 64},
+    'opus': {"mimetype": "audio/ogg; codecs=opus", "extension": "opus", "codec": "libopus", "muxer": "opus", "bitrate": 32},
+}
+MIN_BITRATE_KBPS = 8
+MAX_BITRATE_KBPS = 320
+
+def resolve_audio_format(audio_format, bitrate=None):
+    """Validate format/bitrate and return (format, bitrate_kbps), falling back to WAV without ffmpeg"""
+    audio_format = (audio_format or 'wav').lower()
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported format: {audio_format} (use one of {', '.join(AUDIO_FORMATS)})")
+    
+    if audio_format == 'wav':
+        return 'wav', None
+    if not TTS_FFMPEG:
+        logger.warning(f"ffmpeg not found, returning WAV instead of {audio_format}")
+        return 'wav', None
+    
+    if bitrate is None:
+        return audio_format, AUDIO_FORMATS[audio_format]['bitrate']
+    try:
+        kbps = int(str(bitrate).lower().rstrip('k'))
+    except ValueError:
+        raise ValueError(f"Invalid bitrate: {bitrate}")
+    return audio_format, min(max(kbps, MIN_BITRATE_KBPS), MAX_BITRATE_KBPS)
+
+def encode_audio(wav_path, output_path, audio_format, bitrate, wav_data=None):
+    """Encode a rendered WAV with ffmpeg, from wav_path or piped in as wav_data"""
+    spec = AUDIO_FORMATS[audio_format]
+    result = subprocess.run([
+        TTS_FFMPEG, '-hide_banner', '-loglevel', 'error', '-y',
+        *(['-i', 'pipe:0'] if wav_data is not None else ['-nostdin', '-i', wav_path]),
+        '-vn', '-c:a', spec['codec'], '-b:a', f"{bitrate}k",
+        *spec.get('options', []),
+        '-f', spec['muxer'], output_path
+    ], input=wav_data, capture_output=True, timeout=120)
+    if result.returncode != 0:
+        raise Exception(f"Audio encoding failed: {result.stderr.decode(errors='replace').strip()[:200]}")
+
+# Post-processing settings (needs numpy)
+TTS_POSTPROCESS = np is not None and os.environ.get('TTS_POSTPROCESS', '1').lower() not in ('0', 'false', 'no', 'off')
+TTS_TRIM_THRESHOLD_DB = float(os.environ.get('TTS_TRIM_THRESHOLD_DB', '-40'))  # Relative to the clip's peak
+TTS_TRIM_PADDING_MS = float(os.environ.get('TTS_TRIM_PADDING_MS', '40'))
+TTS_TRIM_WINDOW_MS = 10
+TTS_NORMALIZE = os.environ.get('TTS_NORMALIZE', 'peak').lower()  # peak, rms or none
+TTS_PEAK_TARGET_DB = float(os.environ.get('TTS_PEAK_TARGET_DB', '-1'))
+TTS_RMS_TARGET_DB = float(os.environ.get('TTS_RMS_TARGET_DB', '-20'))
+TTS_TARGET_RATE = int(os.environ.get('TTS_TARGET_RATE', '0'))  # Resample to this rate; 0 keeps the engine's
+
+def postprocess_signature():
+    """Settings that change post-processed audio, for the cache key"""
+    if not TTS_POSTPROCESS:
+        return None
+    return f"trim{TTS_TRIM_THRESHOLD_DB}/{TTS_TRIM_PADDING_MS}:{TTS_NORMALIZE}{TTS_PEAK_TARGET_DB}/{TTS_RMS_TARGET_DB}:{TTS_TARGET_RATE}"
+
+def decode_wav(wav_data):
+    """PCM WAV bytes to (float32 samples of shape (frames, channels) in [-1, 1], sample rate)"""
+    with wave.open(io.BytesIO(wav_data), 'rb') as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        raw = wav.readframes(wav.getnframes())
+    
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768
+    elif width == 3:
+        padded = np.zeros((len(raw) // 3, 4), dtype=np.uint8)
+        padded[:, 1:] = np.frombuffer(raw[:len(raw) // 3 * 3], dtype=np.uint8).reshape(-1, 3)
+        samples = padded.view('<i4').ravel().astype(np.float32) / 2147483648
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Unsupported sample width: {width} bytes")
+    return samples[:len(samples) // channels * channels].reshape(-1, channels), rate
+
+def encode_wav(samples, rate):
+    """Float samples of shape (frames, channels) to 16-bit PCM WAV bytes"""
+    pcm = (np.clip(samples, -1, 1) * 32767).round().astype('<i2')
+    output = io.BytesIO()
+    with wave.open(output, 'wb') as wav:
+        wav.setnchannels(samples.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm.tobytes())
+    return output.getvalue()
+
+def resample(samples, rate, target_rate):
+    """Linear-interpolation resampling, box-filtered first when downsampling"""
+    if not target_rate or target_rate == rate or len(samples) < 2:
+        return samples, rate
+    ratio = rate / target_rate
+    if ratio > 1:
+        width = int(np.ceil(ratio))
+        kernel = np.ones(width, dtype=np.float32) / width
+        samples = np.stack([np.convolve(samples[:, channel], kernel, mode='same') for channel in range(samples.shape[1])], axis=1)
+    frames = max(1, int(round(len(samples) / ratio)))
+    positions = np.linspace(0, len(samples) - 1, frames)
+    source = np.arange(len(samples))
+    return np.stack([np.interp(positions, source, samples[:, channel]) for channel in range(samples.shape[1])], axis=1).astype(np.float32), target_rate
+
+def postprocess_clips(clips, target_rate=None):
+    """Trim silence, normalise loudness and resample a batch of WAV clips.
+    
+    Clips with the same sample rate are processed together as one padded
+    array. Returns (wav bytes, report) per clip, in order.
+    """
+    target_rate = TTS_TARGET_RATE if target_rate is None else target_rate
+    decoded = [decode_wav(clip) for clip in clips]
+    results = [None] * len(clips)
+    
+    by_rate = {}
+    for index, (samples, rate) in enumerate(decoded):
+        by_rate.setdefault(rate, []).append(index)
+    
+    for rate, indexes in by_rate.items():
+        window = max(1, int(rate * TTS_TRIM_WINDOW_MS / 1000))
+        padding = int(rate * TTS_TRIM_PADDING_MS / 1000)
+        lengths = np.array([len(decoded[i][0]) for i in indexes])
+        windows = -(-lengths.max() // window)
+        
+        # Mono envelope of every clip in one zero-padded (clips, samples) array
+        mono = np.zeros((len(indexes), windows * window), dtype=np.float32)
+        for row, index in enumerate(indexes):
+            mono[row, :lengths[row]] = np.abs(decoded[index][0]).max(axis=1)
+        envelope = mono.reshape(len(indexes), windows, window).max(axis=2)
+        peaks = envelope.max(axis=1)
+        
+        # First and last window above the threshold, relative to each clip's peak
+        loud = envelope > (peaks * 10 ** (TTS_TRIM_THRESHOLD_DB / 20))[:, None]
+        any_loud = loud.any(axis=1)
+        first = np.where(any_loud, loud.argmax(axis=1) * window - padding, 0).clip(0)
+        last = np.where(any_loud, (windows - loud[:, ::-1].argmax(axis=1)) * window + padding, lengths)
+        last = np.minimum(last, lengths)
+        
+        # Gains from peak, or RMS over the kept part, never pushing the peak past the peak target
+        peak_gain = np.where(peaks > 0, 10 ** (TTS_PEAK_TARGET_DB / 20) / np.maximum(peaks, 1e-9), 1.0)
+        if TTS_NORMALIZE == 'rms':
+            energy = np.concatenate([np.zeros((len(indexes), 1)), np.cumsum(mono.astype(np.float64) ** 2, axis=1)], axis=1)
+            kept = np.maximum(last - first, 1)
+            rms = np.sqrt((energy[np.arange(len(indexes)), last] - energy[np.arange(len(indexes)), first]) / kept)
+            gains = np.minimum(np.where(rms > 0, 10 ** (TTS_RMS_TARGET_DB / 20) / np.maximum(rms, 1e-9), 1.0), peak_gain)
+        elif TTS_NORMALIZE == 'peak':
+            gains = peak_gain
+        else:
+            gains = np.ones(len(indexes))
+        
+        for row, index in enumerate(indexes):
+            samples = decoded[index][0][first[row]:last[row]] * np.float32(gains[row])
+            samples, out_rate = resample(samples, rate, target_rate)
+            wav_data = encode_wav(samples, out_rate)
+            ms_before = lengths[row] * 1000 / rate
+            ms_after = len(samples) * 1000 / out_rate
+            results[index] = (wav_data, {
+                "bytes_before": len(clips[index]),
+                "bytes_after": len(wav_data),
+                "bytes_saved": len(clips[index]) - len(wav_data),
+                "ms_before": round(float(ms_before), 1),
+                "ms_after": round(float(ms_after), 1),
+                "ms_saved": round(float(ms_before - ms_after), 1),
+                "trimmed_start_ms": round(float(first[row] * 1000 / rate), 1),
+                "trimmed_end_ms": round(float((lengths[row] - last[row]) * 1000 / rate), 1),
+                "gain_db": round(float(20 * np.log10(max(gains[row], 1e-9))), 2),
+                "sample_rate": out_rate
+            })
+    return results
+
+# Synthesis cache settings
+TTS_CACHE_DIR = os.environ.get('TTS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'llm-dictionary-tts-cache'))
+TTS_CACHE_MAX_BYTES = int(float(os.environ.get('TTS_CACHE_MAX_MB', '256')) * 1024 * 1024)
+
+# Uncached renders go to tmpfs when available so they never touch the disk
+TTS_RENDER_DIR = os.environ.get('TTS_RENDER_DIR') or (
+    '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+)
+
+def open_and_unlink(path):
+    """Open a rendered file for reading so it disappears once the handle is closed"""
+    if os.name == 'nt':
+        # Windows cannot unlink open files; delete-on-close does the same job
+        fd = os.open(path, os.O_RDONLY | os.O_BINARY | os.O_TEMPORARY)
+        return os.fdopen(fd, 'rb')
+    audio_file = open(path, 'rb')
+    os.unlink(path)
+    return audio_file
+
+class SynthesisCache:
+    """On-disk LRU cache of rendered audio, keyed by a hash of text and engine settings"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> file size, least recently used first
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        
+        if self.enabled:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._load()
+            except OSError as e:
+                logger.error(f"Synthesis cache disabled, cannot use {self.directory}: {e}")
+                self.max_bytes = 0
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(**settings):
+        """Hash every setting that affects the rendered audio"""
+        payload = json.dumps(settings, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path_for(self, key):
+        return self.directory / f"{key}.audio"
+
+    def render_path(self, key):
+        """Scratch path on the cache filesystem, so adopting a render is a rename"""
+        return self.directory / f"{key}.{uuid.uuid4().hex}.render"
+
+    def _load(self):
+        """Index files left by a previous run, oldest access first"""
+        for path in self.directory.glob('*.render'):
+            try:
+                path.unlink()  # Interrupted render
+            except OSError:
+                pass
+        
+        files = []
+        for path in self.directory.glob('*.audio'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.stem, stat.st_size))
+        
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+        
+        self._evict()
+        logger.info(f"Synthesis cache: {len(self.entries)} entries, {self.total_bytes} bytes in {self.directory}")
+
+    def open(self, key):
+        """Return an open file for a cached entry, or None on a miss"""
+        with self.lock:
+            if key in self.entries:
+                path = self.path_for(key)
+                try:
+                    audio_file = open(path, 'rb')
+                except OSError:
+                    self.total_bytes -= self.entries.pop(key)
+                else:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    try:
+                        os.utime(path)  # Persist LRU order across restarts
+                    except OSError:
+                        pass
+                    return audio_file
+            self.misses += 1
+            return None
+
+    def contains(self, key):
+        """Whether an entry is cached, without touching hit counts or LRU order"""
+        with self.lock:
+            return key in self.entries
+
+    def adopt(self, key, rendered_path):
+        """Move a rendered file into the cache and return it opened, or None if not cached"""
+        if not self.enabled:
+            return None
+        
+        size = os.path.getsize(rendered_path)
+        if size > self.max_bytes:
+            return None
+        
+        path = self.path_for(key)
+        try:
+            os.replace(rendered_path, path)
+            audio_file = open(path, 'rb')
+        except OSError as e:
+            logger.warning(f"Failed to store synthesis cache entry: {e}")
+            return None
+        
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+            self.entries[key] = size
+            self.total_bytes += size
+            self._evict()
+        return audio_file
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                self.path_for(key).unlink()
+            except OSError:
+                pass  # Still being served on Windows; orphan is re-indexed on next start
+
+    def stats(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+synthesis_cache = SynthesisCache(TTS_CACHE_DIR, TTS_CACHE_MAX_BYTES) if IS_MAIN_PROCESS else None
+
+def find_voice(voices, requested=None):
+    """Pick the voice matching the requested id/language, falling back to English"""
+    if requested:
+        requested = requested.lower()
         for voice in voices:
-            if 'english' in voice.name.lower() or 'en' in voice.id.lower():
-                tts_engine.setProperty('voice', voice.id)
-                break
+            if voice.id.lower() == requested or requested in voice.id.lower():
+                return voice.id
+    for voice in voices:
+        if 'english' in voice.name.lower() or 'en' in voice.id.lower():
+            return voice.id
+    return None
+
+# Engine warm-up settings
+TTS_WARMUP_WAIT = float(os.environ.get('TTS_WARMUP_WAIT', '30'))  # Seconds a request waits for warm-up
+
+def describe_voice(voice):
+    """JSON-friendly summary of a pyttsx3 voice"""
+    languages = [
+        language.decode('utf-8', 'replace').lstrip('\x05') if isinstance(language, bytes) else str(language)
+        for language in (getattr(voice, 'languages', None) or [])
+    ]
+    return {
+        "id": voice.id,
+        "name": voice.name,
+        "languages": languages,
+        "gender": getattr(voice, 'gender', None),
+        "age": getattr(voice, 'age', None)
+    }
+
+class EngineWarmup:
+    """Starts the TTS engine and workers in the background so the port opens immediately.
+    
+    State goes starting -> warming -> ready (or failed). The probe engine and
+    the voice list are kept once loaded.
+    """
+
+    def __init__(self):
+        self.state = 'starting'
+        self.engine = None
+        self.voices = []
+        self.default_voice = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+        self.thread = None
+        self.ready = threading.Event()
+
+    def start(self):
+        """Begin warming up in a background thread, once"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._warm_up, name="tts-warmup", daemon=True)
+                self.thread.start()
+
+    def _warm_up(self):
+        self.state = 'warming'
+        self.started = time.time()
+        try:
+            import pyttsx3
+            engine = pyttsx3.init()
+            voices = engine.getProperty('voices') or []
+            self.voices = [describe_voice(voice) for voice in voices]
+            # Try to set English voice
+            self.default_voice = find_voice(voices)
+            if self.default_voice:
+                engine.setProperty('voice', self.default_voice)
+            engine.setProperty('rate', 180)  # Speed
+            engine.setProperty('volume', TTS_VOLUME)  # Volume
+            self.engine = engine
+            logger.info(f"TTS engine initialized successfully ({len(self.voices)} voices)")
+        except Exception as e:
+            self.error = str(e)
+            if TTS_BACKEND != Pyttsx3Backend.name:
+                logger.warning(f"pyttsx3 unavailable, /voices will be empty: {e}")
+            else:
+                logger.error(f"Failed to initialize TTS engine: {e}")
+                self.state = 'failed'
+                self.finished = time.time()
+                self.ready.set()
+                return
+        
+        try:
+            synthesis_pool.warm_up()
+        except Exception as e:
+            # Workers are restarted on the next submit; the engine itself works
+            logger.warning(f"Synthesis worker warm-up failed: {e}")
+        
+        self.state = 'ready'
+        self.finished = time.time()
+        logger.info(f"TTS warm-up finished in {self.finished - self.started:.2f}s")
+        self.ready.set()
+
+    def available(self, timeout=TTS_WARMUP_WAIT):
+        """Whether the engine works, waiting up to timeout for warm-up to finish"""
+        self.start()
+        self.ready.wait(timeout)
+        return self.state == 'ready'
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "error": self.error,
+            "voices": len(self.voices),
+            "warmup_seconds": round(self.finished - self.started, 3) if self.finished else None
+        }
+
+tts_engine = EngineWarmup()
+
+# Synthesis worker settings
+TTS_WORKERS = int(os.environ.get('TTS_WORKERS', min(4, os.cpu_count() or 1)))
+TTS_QUEUE_SIZE = int(os.environ.get('TTS_QUEUE_SIZE', '32'))
+TTS_BACKGROUND_RENDERS = int(os.environ.get('TTS_BACKGROUND_RENDERS', TTS_WORKERS))  # Pool slots background jobs may hold
+
+# Synthesis backend settings
+TTS_BACKEND = os.environ.get('TTS_BACKEND', 'pyttsx3').lower()
+TTS_ESPEAK = os.environ.get('TTS_ESPEAK') or shutil.which('espeak-ng') or shutil.which('espeak')
+TTS_STUB_ENABLED = os.environ.get('TTS_ENABLE_STUB', '0') == '1' or TTS_BACKEND == 'stub'  # Test tone, never for production
+TTS_STUB_DELAY = float(os.environ.get('TTS_STUB_DELAY_MS', '0')) / 1000  # Simulated render time
+TTS_STUB_SAMPLE_RATE = 16000
+
+class Pyttsx3Backend:
+    """The pyttsx3 engine: portable, but each utterance goes through its event loop and a WAV file"""
+    name = 'pyttsx3'
+
+    def __init__(self):
+        import pyttsx3
+        self.engine = pyttsx3.init()
+        self.voices = self.engine.getProperty('voices') or []
+
+    def render(self, text, voice, rate, volume, wav_path):
+        voice_id = find_voice(self.voices, voice)
+        if voice_id:
+            self.engine.setProperty('voice', voice_id)
+        self.engine.setProperty('rate', rate)
+        self.engine.setProperty('volume', volume)
+        self.engine.save_to_file(text, wav_path)
+        self.engine.runAndWait()
+        return None
+
+    @staticmethod
+    def probe():
+        """Health check from the main process: the warmed-up probe engine"""
+        if tts_engine.engine is None:
+            raise Exception(tts_engine.error or f"Engine {tts_engine.state}")
+        return True
+
+def fix_wav_sizes(wav_data):
+    """Fill in the RIFF and data sizes that a WAV written to a pipe leaves as placeholders"""
+    data_offset = wav_data.find(b'data', 12)
+    if not wav_data.startswith(b'RIFF') or data_offset < 0:
+        return wav_data
+    return (
+        wav_data[:4] + struct.pack('<I', len(wav_data) - 8) + wav_data[8:data_offset + 4]
+        + struct.pack('<I', len(wav_data) - data_offset - 8) + wav_data[data_offset + 8:]
+    )
+
+class EspeakBackend:
+    """espeak-ng run directly, with the WAV read from its stdout: no event loop, no scratch file"""
+    name = 'espeak'
+
+    def __init__(self):
+        if not TTS_ESPEAK:
+            raise Exception("espeak-ng not found (set TTS_ESPEAK)")
+
+    def render(self, text, voice, rate, volume, wav_path):
+        result = subprocess.run([
+            TTS_ESPEAK, '--stdout', '--stdin',
+            '-v', voice or 'en-us', '-s', str(rate), '-a', str(round(volume * 100))
+        ], input=text.encode('utf-8'), capture_output=True, timeout=60)
+        if result.returncode != 0:
+            raise Exception(f"espeak-ng failed: {result.stderr.decode(errors='replace').strip()[:200]}")
+        return fix_wav_sizes(result.stdout)
+
+    @staticmethod
+    def probe():
+        """Health check from the main process: the binary runs"""
+        if not TTS_ESPEAK:
+            raise Exception("espeak-ng not found")
+        result = subprocess.run([TTS_ESPEAK, '--version'], capture_output=True, timeout=5)
+        if result.returncode != 0:
+            raise Exception(f"espeak-ng --version exited with {result.returncode}")
+        return True
+
+class StubBackend:
+    """Deterministic tone as long as the text would take to say, for benchmarks without an engine"""
+    name = 'stub'
+
+    def render(self, text, voice, rate, volume, wav_path):
+        if TTS_STUB_DELAY:
+            time.sleep(TTS_STUB_DELAY)
+        # Same text and voice always give the same pitch and length
+        seed = int.from_bytes(hashlib.sha256(f"{voice}\0{text}".encode('utf-8')).digest()[:2], 'little')
+        period = TTS_STUB_SAMPLE_RATE // (220 + seed % 440)
+        amplitude = int(12000 * volume)
+        cycle = struct.pack(f'<{period}h', *([amplitude] * (period // 2) + [-amplitude] * (period - period // 2)))
+        frames = int(TTS_STUB_SAMPLE_RATE * (0.2 + 10 * len(text) / max(rate, 1)))  # About six characters a word
+        
+        output = io.BytesIO()
+        with wave.open(output, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(TTS_STUB_SAMPLE_RATE)
+            wav.writeframes((cycle * (frames // period + 1))[:frames * 2])
+        return output.getvalue()
+
+    @staticmethod
+    def probe():
+        return True
+
+# Backends render one utterance: either into wav_path (returning None) or straight to WAV bytes
+SYNTHESIS_BACKENDS = {
+    backend.name: backend
+    for backend in (Pyttsx3Backend, EspeakBackend, StubBackend)
+    if backend is not StubBackend or TTS_STUB_ENABLED
+}
+
+def resolve_backend(backend=None):
+    """Validate a backend name, defaulting to TTS_BACKEND"""
+    backend = (backend or TTS_BACKEND).lower()
+    if backend not in SYNTHESIS_BACKENDS:
+        raise ValueError(f"Unknown backend: {backend} (use one of {', '.join(SYNTHESIS_BACKENDS)})")
+    if backend == EspeakBackend.name and not TTS_ESPEAK:
+        raise ValueError("espeak backend unavailable: espeak-ng not found")
+    return backend
+
+# Backends owned by the current worker process, created on first use
+_worker_backends = {}
+_worker_init_errors = {}
+
+def _worker_backend(name):
+    if name not in _worker_backends and name not in _worker_init_errors:
+        try:
+            _worker_backends[name] = SYNTHESIS_BACKENDS[name]()
+        except Exception as e:
+            _worker_init_errors[name] = str(e)
+    if name not in _worker_backends:
+        raise Exception(f"TTS backend {name} not available in worker: {_worker_init_errors[name]}")
+    return _worker_backends[name]
+
+def _init_synthesis_worker():
+    """Create this worker's private engine for the default backend"""
+    try:
+        _worker_backend(TTS_BACKEND)
+    except Exception:
+        pass  # Reported by _worker_status and on each render
+
+def _render_in_worker(text, voice, rate, volume, output_path, audio_format='wav', bitrate=None, backend=TTS_BACKEND):
+    """Render (and encode) one utterance to output_path; runs inside a synthesis worker"""
+    started = time.perf_counter()
+    engine = _worker_backend(backend)
     
-    tts_engine.setProperty('rate', 180)  # Speed
-    tts_engine.setProperty('volume', 0.9)  # Volume
+    wav_path = output_path if audio_format == 'wav' else f"{output_path}.wav"
+    report = None
+    try:
+        wav_data = engine.render(text, voice, rate, volume, wav_path)
+        render_seconds = time.perf_counter() - started
+        
+        if TTS_POSTPROCESS:
+            original = wav_data
+            try:
+                if wav_data is None and os.path.exists(wav_path):
+                    with open(wav_path, 'rb') as rendered:
+                        wav_data = rendered.read()
+                if wav_data and len(wav_data) >= 1000:
+                    [(wav_data, report)] = postprocess_clips([wav_data])
+            except Exception as e:
+                # Optional step: audio it can't handle (AIFF, float WAV...) goes out untouched
+                logger.warning(f"Audio post-processing skipped: {e}")
+                wav_data, report = original, None
+        
+        if wav_data is not None:
+            if len(wav_data) < 1000:
+                raise Exception("Generated audio too small")
+            if audio_format == 'wav':
+                with open(output_path, 'wb') as output:
+                    output.write(wav_data)
+            else:
+                encode_audio(None, output_path, audio_format, bitrate, wav_data=wav_data)
+        else:
+            if not os.path.exists(wav_path) or os.path.getsize(wav_path) < 1000:
+                raise Exception("Generated audio too small")
+            if audio_format != 'wav':
+                encode_audio(wav_path, output_path, audio_format, bitrate)
+    finally:
+        if wav_path != output_path and os.path.exists(wav_path):
+            os.unlink(wav_path)
     
-    logger.info("TTS engine initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize TTS engine: {e}")
-    tts_engine = None
+    return {
+        "pid": os.getpid(),
+        "busy_seconds": time.perf_counter() - started,
+        "backend": backend,
+        "render_seconds": render_seconds,
+        "chars": len(text),
+        "postprocess": report
+    }
+
+def _worker_status():
+    """Report whether this worker's engine started; used to spawn workers ahead of time"""
+    return {"pid": os.getpid(), "error": _worker_init_errors.get(TTS_BACKEND)}
+
+# Render latency is tracked per backend for these input lengths (characters)
+LATENCY_BUCKETS = (('word', 32), ('sentence', 200), ('long', None))
+LATENCY_SAMPLES = 200
+
+class SynthesisQueueFull(Exception):
+    """Raised when the synthesis queue has no free slots"""
+
+class SynthesisPool:
+    """Pool of worker processes, each owning its own engine, behind a bounded queue"""
+
+    def __init__(self, workers, queue_size, background_renders):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.slots = threading.BoundedSemaphore(self.workers + queue_size)
+        # Background work never takes the last slots, so interactive requests always get in
+        self.background_limit = max(1, min(background_renders, self.workers + queue_size - 1))
+        self.background_slots = threading.BoundedSemaphore(self.background_limit)
+        self.lock = threading.Lock()
+        self.executor = None
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.worker_stats = {}  # pid -> {"jobs", "busy_seconds", "last_busy_seconds"}
+        self.backend_latency = {}  # backend -> {length bucket -> recent render seconds}
+        self.postprocessed = {"clips": 0, "bytes_saved": 0, "ms_saved": 0.0}
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_synthesis_worker
+                )
+                logger.info(f"Started {self.workers} synthesis workers")
+            return self.executor
+
+    def _reset_executor(self, executor):
+        """Drop a broken executor so the next submit starts fresh workers"""
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False)
+
+    def submit(self, fn, *args, background=False):
+        """Queue fn(*args) on a worker, failing fast when the queue (or the background share) is full"""
+        if background and not self.background_slots.acquire(blocking=False):
+            raise SynthesisQueueFull(f"Background renders limited to {self.background_limit} in flight")
+        if not self.slots.acquire(blocking=False):
+            if background:
+                self.background_slots.release()
+            with self.lock:
+                self.rejected += 1
+            raise SynthesisQueueFull(f"Synthesis queue full ({self.workers + self.queue_size} requests in flight)")
+        
+        try:
+            for attempt in range(2):
+                executor = self._get_executor()
+                try:
+                    future = executor.submit(fn, *args)
+                    break
+                except (BrokenProcessPool, RuntimeError):
+                    # Broken, or shut down by a reset after a worker crash: retry once on fresh workers
+                    self._reset_executor(executor)
+                    if attempt:
+                        raise
+        except Exception:
+            self.slots.release()
+            if background:
+                self.background_slots.release()
+            raise
+        
+        with self.lock:
+            self.in_flight += 1
+        future.add_done_callback(lambda f: self._on_done(f, executor, background))
+        return future
+
+    def _on_done(self, future, executor, background=False):
+        self.slots.release()
+        if background:
+            self.background_slots.release()
+        # Futures cancelled by shutdown(cancel_futures=True) raise from exception()
+        error = CancelledError() if future.cancelled() else future.exception()
+        with self.lock:
+            self.in_flight -= 1
+            if error is None:
+                self.completed += 1
+                result = future.result()
+                if isinstance(result, dict) and 'pid' in result:
+                    stats = self.worker_stats.setdefault(result['pid'], {"jobs": 0, "busy_seconds": 0.0})
+                    stats["jobs"] += 1
+                    stats["busy_seconds"] += result['busy_seconds']
+                    stats["last_busy_seconds"] = result['busy_seconds']
+                if isinstance(result, dict) and 'backend' in result:
+                    bucket = next(name for name, limit in LATENCY_BUCKETS if limit is None or result['chars'] <= limit)
+                    buckets = self.backend_latency.setdefault(result['backend'], {})
+                    buckets.setdefault(bucket, deque(maxlen=LATENCY_SAMPLES)).append(result['render_seconds'])
+                if isinstance(result, dict) and result.get('postprocess'):
+                    self.postprocessed["clips"] += 1
+                    self.postprocessed["bytes_saved"] += result['postprocess']['bytes_saved']
+                    self.postprocessed["ms_saved"] += result['postprocess']['ms_saved']
+            else:
+                self.failed += 1
+        if isinstance(error, BrokenProcessPool):
+            self._reset_executor(executor)
+
+    def warm_up(self):
+        """Start every worker process and its engine before the first request needs them"""
+        executor = self._get_executor()
+        futures = [executor.submit(_worker_status) for _ in range(self.workers)]
+        for future in futures:
+            status = future.result()
+            if status["error"]:
+                logger.warning(f"Synthesis worker {status['pid']} has no engine: {status['error']}")
+
+    def backend_stats(self):
+        """Render latency per backend and input length, from the most recent renders"""
+        with self.lock:
+            latency = {
+                backend: {bucket: sorted(samples) for bucket, samples in buckets.items()}
+                for backend, buckets in self.backend_latency.items()
+            }
+        return {
+            backend: {
+                bucket: {
+                    "samples": len(samples),
+                    "mean_ms": round(sum(samples) / len(samples) * 1000, 1),
+                    "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+                    "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 1)
+                }
+                for bucket, samples in buckets.items()
+            }
+            for backend, buckets in latency.items()
+        }
+
+    def idle(self):
+        """True when no render is running or queued"""
+        with self.lock:
+            return self.in_flight == 0
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "background_limit": self.background_limit,
+                "in_flight": self.in_flight,
+                "queue_depth": max(0, self.in_flight - self.workers),
+                "postprocess": {**self.postprocessed, "enabled": TTS_POSTPROCESS, "ms_saved": round(self.postprocessed["ms_saved"], 1)},
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "worker_busy": {
+                    str(pid): {
+                        "jobs": stats["jobs"],
+                        "busy_seconds": round(stats["busy_seconds"], 3),
+                        "last_busy_seconds": round(stats["last_busy_seconds"], 3)
+                    }
+                    for pid, stats in self.worker_stats.items()
+                }
+            }
+
+synthesis_pool = SynthesisPool(TTS_WORKERS, TTS_QUEUE_SIZE, TTS_BACKGROUND_RENDERS)
+
+# Batch synthesis settings
+TTS_BATCH_MAX_ITEMS = int(os.environ.get('TTS_BATCH_MAX_ITEMS', '100'))
+
+# Prefetch settings
+TTS_PREFETCH_MAX_ITEMS = int(os.environ.get('TTS_PREFETCH_MAX_ITEMS', '1000'))
+TTS_PREFETCH_CPU_BUDGET = min(1.0, max(0.05, float(os.environ.get('TTS_PREFETCH_CPU_BUDGET', '0.5'))))  # Share of one worker
+TTS_PREFETCH_POLL = 0.05  # Seconds between checks for an idle pool
+
+# Streaming synthesis settings
+TTS_STREAM_LOOKAHEAD = int(os.environ.get('TTS_STREAM_LOOKAHEAD', max(2, TTS_WORKERS)))
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?;…])\s+')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def split_sentences(text):
+    """Split text into sentence-sized segments for streaming"""
+    return [segment for segment in SENTENCE_BOUNDARY.split(text.strip()) if segment.strip()]
+
+def wav_stream_header(channels, sample_width, frame_rate):
+    """WAV header with unknown (maximum) sizes, as used for streamed PCM"""
+    block_align = channels * sample_width
+    return (
+        b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+        + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, frame_rate, frame_rate * block_align, block_align, sample_width * 8)
+        + b'data' + struct.pack('<I', 0xFFFFFFFF)
+    )
+
+class RenderFlight:
+    """One worker render shared by every concurrent request for the same audio"""
+
+    def __init__(self, cache_key, render_path, audio_format, future):
+        self.cache_key = cache_key
+        self.render_path = render_path
+        self.format = audio_format
+        self.future = future
+        self.waiters = 1  # Requests still expecting a handle; only grows while the flight is registered
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.files = []  # One open handle per remaining waiter
+        self.error = None
+
+    def join(self):
+        """Add a waiter; called under _flights_lock while the flight is registered"""
+        with self.lock:
+            self.waiters += 1
+
+    def _finish(self, future):
+        """Done callback: unregister the flight, adopt the render and open a handle per waiter"""
+        # No new waiters can join once the flight is unregistered
+        with _flights_lock:
+            if _flights.get(self.cache_key) is self:
+                del _flights[self.cache_key]
+        
+        with self.lock:
+            try:
+                if future.cancelled():
+                    raise CancelledError()
+                future.result()
+                
+                size = os.path.getsize(self.render_path)
+                logger.info(f"TTS generated successfully: {size} bytes ({self.format})")
+                
+                # Open every waiter's handle now, before the file can be evicted or unlinked
+                adopted = synthesis_cache.adopt(self.cache_key, self.render_path)
+                if adopted:
+                    self.files = [adopted] + [
+                        open(synthesis_cache.path_for(self.cache_key), 'rb') for _ in range(self.waiters - 1)
+                    ]
+                else:
+                    audio_file = open_and_unlink(self.render_path)
+                    if self.waiters > 1:
+                        # Uncached renders are deleted on close, so share the bytes instead
+                        with audio_file:
+                            audio_data = audio_file.read()
+                        self.files = [io.BytesIO(audio_data) for _ in range(self.waiters)]
+                    else:
+                        self.files = [audio_file]
+                # Waiters that left early need no handle; the cache still keeps the render
+                while len(self.files) > self.waiters:
+                    self.files.pop().close()
+            except Exception as e:
+                self.error = e
+                for audio_file in self.files:
+                    audio_file.close()
+                self.files = []
+                # Clean up on error
+                if os.path.exists(self.render_path):
+                    os.unlink(self.render_path)
+            finally:
+                self.ready.set()
+
+    def open(self, timeout=None):
+        """Wait for the render and take this waiter's file handle"""
+        if not self.ready.wait(timeout):
+            raise TimeoutError("Timed out waiting for synthesis")
+        with self.lock:
+            if self.error is not None:
+                raise self.error
+            self.waiters -= 1
+            return self.files.pop()
+
+    def release(self):
+        """Drop a waiter that will never call open(), closing its handle if already opened"""
+        with self.lock:
+            self.waiters -= 1
+            if self.ready.is_set() and self.files:
+                self.files.pop().close()
+
+_flights = {}  # cache key -> RenderFlight
+_flights_lock = threading.Lock()
+coalesced_requests = 0
+
+class SynthesisJob:
+    """One synthesis request, served from the cache or a (possibly shared) worker render"""
+
+    def __init__(self, text, voice='en-us', quality='high', audio_format='wav', bitrate=None, backend=None,
+                 background=False):
+        global coalesced_requests
+        self.text = text
+        self.voice = voice
+        self.rate, self.format, self.bitrate, self.backend, self.cache_key = self.settings(
+            text, voice, quality, audio_format, bitrate, backend
+        )
+        with metrics.phase('read'):
+            self.file = synthesis_cache.open(self.cache_key)
+        self.cached = self.file is not None
+        self.coalesced = False
+        self.audio_data = None
+        self.flight = None
+        self.released = False
+        
+        if self.cached:
+            logger.info(f"TTS cache hit for: {text[:50]}...")
+            return
+        
+        with _flights_lock:
+            self.flight = _flights.get(self.cache_key)
+            if self.flight:
+                # Identical render already in progress: wait for it instead of rendering again
+                self.flight.join()
+                self.coalesced = True
+                coalesced_requests += 1
+                logger.info(f"Joining in-flight TTS for: {text[:50]}...")
+                return
+            
+            logger.info(f"Generating TTS for: {text[:50]}...")
+            # Workers render straight into the cache directory (or tmpfs when caching is off)
+            if synthesis_cache.enabled:
+                render_path = str(synthesis_cache.render_path(self.cache_key))
+            else:
+                render_path = os.path.join(TTS_RENDER_DIR, f"tts-{uuid.uuid4().hex}.wav")
+            
+            # Render and encode on a worker with its own engine and settings
+            future = synthesis_pool.submit(
+                _render_in_worker, text, voice, self.rate, TTS_VOLUME, render_path, self.format, self.bitrate, self.backend,
+                background=background
+            )
+            self.flight = RenderFlight(self.cache_key, render_path, self.format, future)
+            _flights[self.cache_key] = self.flight
+        # Outside the lock: the callback runs right away if the render already finished
+        future.add_done_callback(self.flight._finish)
+
+    @staticmethod
+    def settings(text, voice, quality, audio_format, bitrate, backend=None):
+        """Resolve request options to (rate, format, bitrate, backend, cache key)"""
+        rate = QUALITY_RATES.get(quality, QUALITY_RATES['low'])
+        audio_format, bitrate = resolve_audio_format(audio_format, bitrate)
+        backend = resolve_backend(backend)
+        cache_key = synthesis_cache.make_key(
+            text=text, voice=voice, rate=rate, volume=TTS_VOLUME,
+            format=audio_format, bitrate=bitrate, backend=backend, post=postprocess_signature()
+        )
+        return rate, audio_format, bitrate, backend, cache_key
+
+    @property
+    def postprocess(self):
+        """Post-processing report for audio rendered by this request, None for cache hits"""
+        if self.cached or not self.flight.future.done() or self.flight.future.exception():
+            return None
+        result = self.flight.future.result()
+        return result.get('postprocess') if isinstance(result, dict) else None
+
+    @property
+    def mimetype(self):
+        return AUDIO_FORMATS[self.format]['mimetype']
+
+    @property
+    def download_name(self):
+        return f"audio.{AUDIO_FORMATS[self.format]['extension']}"
+
+    def _wait(self, timeout=None):
+        if self.file is None and self.audio_data is None:
+            with metrics.phase('render'):
+                wait_futures([self.flight.future], timeout)
+            with metrics.phase('read'):
+                self.file = self.flight.open(timeout)
+
+    def audio_file(self, timeout=None):
+        """Open file with the audio, for send_file to stream and close"""
+        self._wait(timeout)
+        return self.file
+
+    def audio_bytes(self, timeout=None):
+        """Audio contents, for responses that must embed the clip"""
+        self._wait(timeout)
+        if self.audio_data is None:
+            with self.file:
+                self.audio_data = self.file.read()
+        return self.audio_data
+
+    def close(self):
+        """Drop this request: close its handle, or tell a running flight it no longer needs one"""
+        if self.file is not None:
+            self.file.close()
+        elif self.audio_data is None and self.flight is not None and not self.released:
+            self.flight.release()
+        self.released = True
 
 # Anki Connect settings
-ANKI_CONNECT_URL = "http://localhost:8765"
+ANKI_CONNECT_URL = os.environ.get('ANKI_CONNECT_URL', "http://localhost:8765")
+ANKI_CONNECT_TIMEOUT = (
+    float(os.environ.get('ANKI_CONNECT_CONNECT_TIMEOUT', '2')),
+    float(os.environ.get('ANKI_CONNECT_READ_TIMEOUT', '30'))
+)
+ANKI_CONNECT_RETRIES = int(os.environ.get('ANKI_CONNECT_RETRIES', '2'))
+ANKI_CONNECT_BACKOFF = 0.25  # Seconds, doubled after each retry
+ANKI_CIRCUIT_FAILURES = 3  # Consecutive transport failures before failing fast
+ANKI_CIRCUIT_COOLDOWN = 10  # Seconds before trying Anki again
 ANKI_MEDIA_FOLDER = None
 
+class AnkiUnavailable(Exception):
+    """Raised without contacting Anki while the circuit breaker is open"""
+
+class AnkiError(Exception):
+    """AnkiConnect answered, rejecting the action with an error message"""
+
+class AnkiConnectClient:
+    """Keep-alive AnkiConnect client with timeouts, retries and a circuit breaker"""
+
+    # Actions that are safe to resend after the request may have reached Anki
+    READ_ONLY_ACTIONS = {
+        'version', 'deckNames', 'modelNames', 'modelFieldNames', 'getMediaDirPath',
+        'findNotes', 'notesInfo', 'getMediaFilesNames'
+    }
+
+    def __init__(self, url, timeout, retries, backoff, circuit_failures, circuit_cooldown):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.circuit_failures = circuit_failures
+        self.circuit_cooldown = circuit_cooldown
+        self.session = requests.Session()
+        self.session.mount('http://', requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=16))
+        self.lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.open_until = 0
+        self.trial_in_progress = False
+        self.action_stats = {}  # action -> {"count", "errors", "total_ms", "max_ms", "last_ms"}
+
+    def _check_circuit(self):
+        with self.lock:
+            if self.consecutive_failures < self.circuit_failures:
+                return
+            if time.time() < self.open_until or self.trial_in_progress:
+                raise AnkiUnavailable("AnkiConnect unavailable (circuit open), retrying shortly")
+            # Half-open: let a single request through to probe Anki
+            self.trial_in_progress = True
+
+    def _record(self, action, elapsed_ms, error=False):
+        with self.lock:
+            stats = self.action_stats.setdefault(action, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+            stats["last_ms"] = elapsed_ms
+            if error:
+                stats["errors"] += 1
+
+    def _settle(self, transport_failure):
+        """Feed the outcome of one logical request (after retries) into the circuit breaker"""
+        with self.lock:
+            self.trial_in_progress = False
+            if transport_failure:
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= self.circuit_failures:
+                    self.open_until = time.time() + self.circuit_cooldown
+                    logger.warning(f"AnkiConnect circuit open for {self.circuit_cooldown}s")
+            else:
+                self.consecutive_failures = 0
+
+    def _read_only(self, action, params):
+        if action == 'multi':
+            return all(inner.get('action') in self.READ_ONLY_ACTIONS for inner in params.get('actions', []))
+        return action in self.READ_ONLY_ACTIONS
+
+    def _retryable(self, action, params, error):
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True  # Never reached Anki
+        if self._read_only(action, params):
+            return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+        return False
+
+    def request(self, action, **params):
+        """Run one AnkiConnect action and return its result"""
+        self._check_circuit()
+        payload = {"action": action, "version": 6, "params": params}
+        
+        transport_failure = True
+        try:
+            attempt = 0
+            while True:
+                started = time.perf_counter()
+                try:
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                except requests.exceptions.RequestException as e:
+                    self._record(action, (time.perf_counter() - started) * 1000, error=True)
+                    if attempt < self.retries and self._retryable(action, params, e):
+                        time.sleep(self.backoff * (2 ** attempt))
+                        attempt += 1
+                        continue
+                    raise
+                break
+            
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                self._record(action, elapsed_ms, error=True)
+                raise Exception(f"HTTP {response.status_code}")
+            
+            try:
+                data = response.json()
+            except ValueError:
+                self._record(action, elapsed_ms, error=True)
+                raise Exception("AnkiConnect returned a response that is not JSON")
+            transport_failure = False
+            self._record(action, elapsed_ms, error=bool(data.get('error')))
+            if data.get('error'):
+                raise AnkiError(data['error'])
+            return data.get('result')
+        finally:
+            self._settle(transport_failure)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "circuit_open": self.consecutive_failures >= self.circuit_failures and time.time() < self.open_until,
+                "consecutive_failures": self.consecutive_failures,
+                "actions": {
+                    action: {
+                        "count": stats["count"],
+                        "errors": stats["errors"],
+                        "avg_ms": round(stats["total_ms"] / stats["count"], 2),
+                        "max_ms": round(stats["max_ms"], 2),
+                        "last_ms": round(stats["last_ms"], 2)
+                    }
+                    for action, stats in self.action_stats.items()
+                }
+            }
+
+anki_client = AnkiConnectClient(
+    ANKI_CONNECT_URL, ANKI_CONNECT_TIMEOUT, ANKI_CONNECT_RETRIES, ANKI_CONNECT_BACKOFF,
+    ANKI_CIRCUIT_FAILURES, ANKI_CIRCUIT_COOLDOWN
+)
+
 def get_anki_media_folder():
     """Get Anki media folder path"""
     global ANKI_MEDIA_FOLDER
@@ -56,17 +1344,11 @@ def get_anki_media_folder():
     
     try:
         # Try to get media folder from Anki
-        response = requests.post(ANKI_CONNECT_URL, json={
-            "action": "getMediaDirPath",
-            "version": 6
-        })
-        
-        if response.status_code == 200:
-            data = response.json()
-            if 'result' in data and data['result']:
-                ANKI_MEDIA_FOLDER = data['result']
-                logger.info(f"Anki media folder: {ANKI_MEDIA_FOLDER}")
-                return ANKI_MEDIA_FOLDER
+        result = anki_client.request("getMediaDirPath")
+        if result:
+            ANKI_MEDIA_FOLDER = result
+            logger.info(f"Anki media folder: {ANKI_MEDIA_FOLDER}")
+            return ANKI_MEDIA_FOLDER
     except Exception as e:
         logger.error(f"Failed to get Anki media folder: {e}")
     
@@ -75,45 +1357,296 @@ def get_anki_media_folder():
 def anki_request(action, **params):
     """Make request to Anki Connect"""
     try:
-        response = requests.post(ANKI_CONNECT_URL, json={
-            "action": action,
-            "version": 6,
-            "params": params
-        })
-        
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('error'):
-                raise Exception(data['error'])
-            return data.get('result')
-        else:
-            raise Exception(f"HTTP {response.status_code}")
+        return anki_client.request(action, **params)
     except Exception as e:
         logger.error(f"Anki request failed: {e}")
         raise
 
+def anki_multi(*actions):
+    """Run several (action, params) pairs in one AnkiConnect "multi" round trip.
+    
+    Returns one {"result", "error"} dict per action, in order.
+    """
+    results = anki_request("multi", actions=[
+        {"action": action, "version": 6, "params": params or {}}
+        for action, params in actions
+    ])
+    
+    # Inner actions answer in the v6 envelope; older AnkiConnect returns bare results
+    return [
+        result if isinstance(result, dict) and set(result) == {"result", "error"} else {"result": result, "error": None}
+        for result in results
+    ]
+
+def set_anki_media_folder(outcome):
+    """Remember a getMediaDirPath outcome fetched as part of a multi request"""
+    global ANKI_MEDIA_FOLDER
+    if outcome["result"] and not outcome["error"]:
+        if ANKI_MEDIA_FOLDER != outcome["result"]:
+            logger.info(f"Anki media folder: {outcome['result']}")
+        ANKI_MEDIA_FOLDER = outcome["result"]
+    return ANKI_MEDIA_FOLDER
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint, served from the background monitor's last probes"""
+    tts_engine.start()
+    probes = health_monitor.snapshot()
     return jsonify({
         "status": "running",
-        "tts_available": tts_engine is not None,
-        "anki_available": check_anki_connection(),
+        "state": tts_engine.state,
+        "tts_available": tts_engine.state == 'ready',
+        "engine": tts_engine.stats(),
+        "anki_available": bool(probes.get('anki', {}).get('ok')),
+        "probes": probes,
+        "anki_client": anki_client.stats(),
+        "anki_metadata_cache": anki_metadata.stats(),
+        "audio_index": audio_index.stats(),
+        "encoder_available": TTS_FFMPEG is not None,
+        "cache": synthesis_cache.stats(),
+        "workers": synthesis_pool.stats(),
+        "backends": synthesis_pool.backend_stats(),
+        "single_flight": {"in_flight": len(_flights), "coalesced": coalesced_requests},
+        "jobs": job_manager.stats(),
         "timestamp": time.time()
     })
 
+# Anki metadata cache settings
+ANKI_METADATA_TTL = float(os.environ.get('ANKI_METADATA_TTL', '30'))  # Seconds a value is fresh
+ANKI_METADATA_MAX_STALE = float(os.environ.get('ANKI_METADATA_MAX_STALE', '3600'))  # Serve stale while refreshing
+
+class AnkiMetadataCache:
+    """Short-TTL cache for decks, note types and fields with stale-while-revalidate"""
+
+    def __init__(self, ttl, max_stale):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.entries = {}  # (action, params) -> (value, fetched_at)
+        self.refreshing = set()
+        self.generation = 0  # Bumped on invalidation so in-flight fetches don't resurrect old data
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refresh_failures = 0
+
+    def get(self, action, **params):
+        """Return the AnkiConnect result, from cache when fresh enough"""
+        key = (action, json.dumps(params, sort_keys=True))
+        with self.lock:
+            entry = self.entries.get(key)
+            generation = self.generation
+            if entry:
+                value, fetched_at = entry
+                age = time.time() - fetched_at
+                if age < self.ttl:
+                    self.hits += 1
+                    return value
+                if age < self.max_stale:
+                    self.stale_hits += 1
+                    if key not in self.refreshing:
+                        self.refreshing.add(key)
+                        threading.Thread(target=self._refresh, args=(key, action, params, generation), daemon=True).start()
+                    return value
+            self.misses += 1
+        
+        value = anki_request(action, **params)
+        self._store(key, value, generation)
+        return value
+
+    def _refresh(self, key, action, params, generation):
+        try:
+            self._store(key, anki_request(action, **params), generation)
+        except Exception as e:
+            with self.lock:
+                self.refresh_failures += 1
+            logger.warning(f"Background refresh of {action} failed, keeping stale value: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def _store(self, key, value, generation):
+        with self.lock:
+            if generation == self.generation:
+                self.entries[key] = (value, time.time())
+
+    def invalidate(self, *actions):
+        """Drop cached results for the given actions, or everything"""
+        with self.lock:
+            self.generation += 1
+            if actions:
+                self.entries = {key: entry for key, entry in self.entries.items() if key[0] not in actions}
+            else:
+                self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refresh_failures": self.refresh_failures
+            }
+
+anki_metadata = AnkiMetadataCache(ANKI_METADATA_TTL, ANKI_METADATA_MAX_STALE)
+
 def check_anki_connection():
     """Check if Anki Connect is available"""
     try:
-        result = anki_request("version")
+        if ANKI_MEDIA_FOLDER:
+            result = anki_request("version")
+        else:
+            # Learn the media folder in the same round trip
+            version, media_folder = anki_multi(("version", None), ("getMediaDirPath", None))
+            set_anki_media_folder(media_folder)
+            result = version["result"]
         return result == 6
     except:
         return False
 
+# Health monitor settings
+HEALTH_PROBE_INTERVAL = float(os.environ.get('HEALTH_PROBE_INTERVAL', '10'))
+HEALTH_HISTORY = int(os.environ.get('HEALTH_HISTORY', '30'))  # Probe results kept per target
+HEALTH_FIRST_PROBE_WAIT = 2.0  # Seconds /health waits for the very first round
+
+class HealthMonitor:
+    """Probes Anki and the synthesis backends on an interval so /health answers from memory"""
+
+    def __init__(self, interval, history):
+        self.interval = interval
+        self.history = history
+        self.probes = {}  # name -> function returning truthy when healthy, or raising
+        self.results = {}
+        self.rounds = 0
+        self.lock = threading.Lock()
+        self.thread = None
+        self.first_round = threading.Event()
+
+    def probe(self, name):
+        """Register a probe function"""
+        def register(fn):
+            self.probes[name] = fn
+            return fn
+        return register
+
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+                self.thread.start()
+
+    def _run(self):
+        while True:
+            self.run_probes()
+            self.first_round.set()
+            time.sleep(self.interval)
+
+    def run_probes(self):
+        for name, fn in self.probes.items():
+            started = time.perf_counter()
+            try:
+                ok = bool(fn())
+                error = None if ok else "Probe failed"
+            except Exception as e:
+                ok = False
+                error = str(e)
+            now = time.time()
+            latency_ms = round((time.perf_counter() - started) * 1000, 2)
+            
+            with self.lock:
+                result = self.results.get(name)
+                if result is None:
+                    result = self.results[name] = {
+                        "ok": None, "error": None, "latency_ms": None, "last_checked": None,
+                        "last_success": None, "last_failure": None, "checks": 0, "failures": 0,
+                        "history": deque(maxlen=self.history)
+                    }
+                result.update(ok=ok, error=error, latency_ms=latency_ms, last_checked=now, checks=result["checks"] + 1)
+                if ok:
+                    result["last_success"] = now
+                else:
+                    result["last_failure"] = now
+                    result["failures"] += 1
+                result["history"].append((now, latency_ms, ok))
+        with self.lock:
+            self.rounds += 1
+
+    def snapshot(self):
+        """Latest probe results, without probing"""
+        self.start()
+        self.first_round.wait(HEALTH_FIRST_PROBE_WAIT)
+        with self.lock:
+            return {
+                name: {
+                    **result,
+                    "history": [{"t": t, "ms": ms, "ok": ok} for t, ms, ok in result["history"]]
+                }
+                for name, result in self.results.items()
+            }
+
+    def ok(self, name):
+        with self.lock:
+            return bool(self.results.get(name, {}).get("ok"))
+
+health_monitor = HealthMonitor(HEALTH_PROBE_INTERVAL, HEALTH_HISTORY)
+
+for _backend in SYNTHESIS_BACKENDS.values():
+    health_monitor.probe(f"backend:{_backend.name}")(_backend.probe)
+
+health_monitor.probe('anki')(check_anki_connection)
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Latency histograms and service counters in Prometheus text format"""
+    if not metrics.enabled:
+        return jsonify({"error": "Metrics are disabled (TTS_METRICS=0)"}), 404
+    
+    cache = synthesis_cache.stats()
+    pool = synthesis_pool.stats()
+    jobs = job_manager.stats()
+    samples = [
+        ('tts_cache_hits_total', 'Synthesis cache hits', 'counter', cache['hits']),
+        ('tts_cache_misses_total', 'Synthesis cache misses', 'counter', cache['misses']),
+        ('tts_cache_bytes', 'Bytes stored in the synthesis cache', 'gauge', cache['bytes']),
+        ('tts_renders_in_flight', 'Renders running or queued on the workers', 'gauge', pool['in_flight']),
+        ('tts_renders_completed_total', 'Renders finished by the workers', 'counter', pool['completed']),
+        ('tts_renders_failed_total', 'Renders that failed', 'counter', pool['failed']),
+        ('tts_renders_rejected_total', 'Renders rejected because the queue was full', 'counter', pool['rejected']),
+        ('tts_renders_coalesced_total', 'Requests that joined an identical in-flight render', 'counter', coalesced_requests),
+        ('tts_jobs_queued', 'Jobs waiting to run', 'gauge', jobs['queued']),
+        ('tts_anki_up', 'Whether the last AnkiConnect probe succeeded', 'gauge', int(health_monitor.ok('anki')))
+    ]
+    return Response(metrics.render(samples), mimetype='text/plain; version=0.0.4')
+
+@app.route('/voices', methods=['GET'])
+def list_voices():
+    """Voices found when the engine started"""
+    if not tts_engine.available():
+        return jsonify({"error": "TTS engine not available", "state": tts_engine.state}), 503
+    return jsonify({"voices": tts_engine.voices, "default": tts_engine.default_voice, "count": len(tts_engine.voices)})
+
+@app.route('/backends', methods=['GET'])
+def list_backends():
+    """Synthesis backends, which one is the default, and their recent render latency"""
+    available = {}
+    for name in SYNTHESIS_BACKENDS:
+        try:
+            resolve_backend(name)
+            available[name] = True
+        except ValueError:
+            available[name] = False
+    return jsonify({
+        "default": TTS_BACKEND,
+        "available": available,
+        "latency": synthesis_pool.backend_stats()
+    })
+
 @app.route('/synthesize', methods=['POST'])
 def synthesize():
     """Generate TTS audio"""
-    if not tts_engine:
+    if not tts_engine.available():
         return jsonify({"error": "TTS engine not available"}), 500
     
     try:
@@ -121,72 +1654,274 @@ def synthesize():
         text = data.get('text', '')
         voice = data.get('voice', 'en-us')
         quality = data.get('quality', 'high')
+        audio_format = data.get('format', 'wav')
+        bitrate = data.get('bitrate')
+        backend = data.get('backend')
+        stream = data.get('stream', False)
         
         if not text:
             return jsonify({"error": "No text provided"}), 400
         
-        logger.info(f"Generating TTS for: {text[:50]}...")
-        
-        # Create temporary file
-        with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-            temp_path = temp_file.name
+        segments = split_sentences(text) if stream else []
+        if len(segments) > 1:
+            try:
+                first_job = SynthesisJob(segments[0], voice, quality, audio_format, bitrate, backend)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            # Render the first segment before committing to a 200, so its failure is a proper error
+            first_job.audio_file()
+            
+            logger.info(f"Streaming TTS in {len(segments)} segments")
+            response = Response(
+                stream_with_context(stream_synthesis(first_job, segments[1:], voice, quality, audio_format, bitrate, backend)),
+                mimetype=first_job.mimetype
+            )
+            response.headers['Content-Disposition'] = f"attachment; filename={first_job.download_name}"
+            response.headers['X-Audio-Format'] = first_job.format
+            response.headers['X-Audio-Segments'] = str(len(segments))
+            # Covers a client that disconnects before the stream starts
+            response.call_on_close(first_job.close)
+            return response
         
         try:
-            # Configure TTS settings based on quality
-            if quality == 'high':
-                tts_engine.setProperty('rate', 160)
-            elif quality == 'medium':
-                tts_engine.setProperty('rate', 180)
-            else:  # low
-                tts_engine.setProperty('rate', 200)
-            
-            # Generate audio
-            tts_engine.save_to_file(text, temp_path)
-            tts_engine.runAndWait()
-            
-            # Read the generated file
-            with open(temp_path, 'rb') as f:
-                audio_data = f.read()
-            
-            # Clean up
-            os.unlink(temp_path)
-            
-            if len(audio_data) < 1000:
-                raise Exception("Generated audio too small")
-            
-            logger.info(f"TTS generated successfully: {len(audio_data)} bytes")
-            
-            # Return audio file
-            return send_file(
-                io.BytesIO(audio_data),
-                mimetype='audio/wav',
+            job = SynthesisJob(text, voice, quality, audio_format, bitrate, backend)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        audio_file = job.audio_file()
+        
+        # Return audio file
+        with metrics.phase('response'):
+            response = send_file(
+                audio_file,
+                mimetype=job.mimetype,
                 as_attachment=True,
-                download_name='audio.wav'
+                download_name=job.download_name
             )
+        response.headers['X-Audio-Format'] = job.format
+        response.headers['X-TTS-Backend'] = job.backend
+        if job.postprocess:
+            response.headers['X-Audio-Saved-Bytes'] = str(job.postprocess['bytes_saved'])
+            response.headers['X-Audio-Saved-Ms'] = str(job.postprocess['ms_saved'])
+        return response
             
-        except Exception as e:
-            # Clean up on error
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-            raise e
-            
+    except SynthesisQueueFull as e:
+        logger.warning(f"TTS request rejected: {e}")
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
         logger.error(f"TTS generation failed: {e}")
         return jsonify({"error": str(e)}), 500
 
+def stream_synthesis(first_job, segments, voice, quality, audio_format, bitrate, backend=None):
+    """Yield audio for each segment in order while later segments render on the workers"""
+    jobs = deque([first_job])
+    remaining = deque(segments)
+    header_sent = False
+    
+    def fill():
+        while remaining and len(jobs) < TTS_STREAM_LOOKAHEAD:
+            try:
+                jobs.append(SynthesisJob(remaining[0], voice, quality, audio_format, bitrate, backend))
+            except SynthesisQueueFull:
+                if jobs:
+                    return  # Retry once the next segment has been sent
+                raise
+            remaining.popleft()
+    
+    try:
+        fill()
+        while jobs:
+            job = jobs.popleft()
+            with job.audio_file() as audio_file:
+                if job.format == 'wav':
+                    # One header up front, then raw PCM from every segment
+                    with wave.open(audio_file, 'rb') as wav:
+                        if not header_sent:
+                            yield wav_stream_header(wav.getnchannels(), wav.getsampwidth(), wav.getframerate())
+                            header_sent = True
+                        while True:
+                            frames = wav.readframes(STREAM_CHUNK_SIZE // max(1, wav.getsampwidth() * wav.getnchannels()))
+                            if not frames:
+                                break
+                            yield frames
+                else:
+                    # MP3 frames and chained Ogg streams can simply be concatenated
+                    while True:
+                        chunk = audio_file.read(STREAM_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        yield chunk
+            fill()
+    except Exception as e:
+        # Headers are already sent, so the best we can do is end the stream early
+        logger.error(f"TTS streaming failed: {e}")
+    finally:
+        # Client went away (GeneratorExit) or a segment failed: release the lookahead renders
+        for job in jobs:
+            job.close()
+
+def run_synthesis_batch(data, progress=None, background=False):
+    """Render a batch of {id, text, voice, quality, format, bitrate} items.
+    
+    Raises ValueError for an invalid batch; per-item failures are reported
+    in the results. progress(done, total) is called as items finish.
+    Background batches only use their share of the pool and wait for room.
+    """
+    items = data.get('items', [])
+    default_voice = data.get('voice', 'en-us')
+    default_quality = data.get('quality', 'high')
+    default_format = data.get('format', 'wav')
+    default_bitrate = data.get('bitrate')
+    default_backend = data.get('backend')
+    
+    if not items:
+        raise ValueError("No items provided")
+    if len(items) > TTS_BATCH_MAX_ITEMS:
+        raise ValueError(f"Too many items (max {TTS_BATCH_MAX_ITEMS})")
+    
+    logger.info(f"Generating batch TTS for {len(items)} items")
+    
+    # Fan out over the workers; identical items share one job
+    jobs = {}
+    item_jobs = []
+    pending = []
+    for index, item in enumerate(items):
+        item_id = item.get('id', index)
+        text = item.get('text', '')
+        if not text:
+            item_jobs.append((item_id, None, "No text provided"))
+            continue
+        
+        voice = item.get('voice', default_voice)
+        quality = item.get('quality', default_quality)
+        audio_format = item.get('format', default_format)
+        bitrate = item.get('bitrate', default_bitrate)
+        backend = item.get('backend', default_backend)
+        job_key = (text, voice, quality, audio_format, bitrate, backend)
+        try:
+            if job_key not in jobs:
+                while True:
+                    try:
+                        jobs[job_key] = SynthesisJob(*job_key, background=background)
+                        break
+                    except SynthesisQueueFull:
+                        if not pending:
+                            if not background:
+                                raise
+                            time.sleep(TTS_PREFETCH_POLL)  # Other background work holds the share
+                            continue
+                        # Wait for our oldest render to free a queue slot
+                        try:
+                            pending.pop(0).audio_bytes()
+                        except Exception:
+                            pass
+                if not jobs[job_key].cached:
+                    pending.append(jobs[job_key])
+            item_jobs.append((item_id, jobs[job_key], None))
+        except Exception as e:
+            item_jobs.append((item_id, None, str(e)))
+    
+    results = []
+    for item_id, job, error in item_jobs:
+        if job is not None:
+            try:
+                audio_data = job.audio_bytes()
+                results.append({
+                    "id": item_id,
+                    "success": True,
+                    "format": job.format,
+                    "backend": job.backend,
+                    "postprocess": job.postprocess,
+                    "mimetype": job.mimetype,
+                    "size": len(audio_data),
+                    "cached": job.cached,
+                    "audio": base64.b64encode(audio_data).decode('ascii')
+                })
+            except Exception as e:
+                error = str(e)
+        if error is not None:
+            logger.error(f"Batch TTS item {item_id} failed: {error}")
+            results.append({"id": item_id, "success": False, "error": error})
+        if progress:
+            progress(len(results), len(item_jobs))
+    
+    succeeded = sum(1 for result in results if result["success"])
+    return {
+        "success": succeeded == len(results),
+        "results": results,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded
+    }
+
+@app.route('/audio/postprocess', methods=['POST'])
+def postprocess_audio():
+    """Trim and normalise base64 WAV clips in one batch, reporting what each one saved"""
+    if np is None:
+        return jsonify({"error": "Post-processing needs numpy: pip install numpy"}), 501
+    
+    try:
+        data = request.get_json()
+        clips = data.get('clips', [])
+        if not clips:
+            return jsonify({"error": "No clips provided"}), 400
+        if len(clips) > TTS_BATCH_MAX_ITEMS:
+            return jsonify({"error": f"Too many clips (max {TTS_BATCH_MAX_ITEMS})"}), 400
+        
+        try:
+            processed = postprocess_clips(
+                [base64.b64decode(clip) for clip in clips],
+                int(data['targetRate']) if data.get('targetRate') is not None else None
+            )
+        except (ValueError, EOFError, wave.Error) as e:
+            return jsonify({"error": f"Invalid clip: {e}"}), 400
+        
+        results = [
+            {**report, "audio": base64.b64encode(wav_data).decode('ascii')}
+            for wav_data, report in processed
+        ]
+        return jsonify({
+            "success": True,
+            "results": results,
+            "bytes_saved": sum(result["bytes_saved"] for result in results),
+            "ms_saved": round(sum(result["ms_saved"] for result in results), 1)
+        })
+    except Exception as e:
+        logger.error(f"Audio post-processing failed: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/synthesize/batch', methods=['POST'])
+def synthesize_batch():
+    """Generate TTS audio for many texts in one request, returned as base64 JSON"""
+    if not tts_engine.available():
+        return jsonify({"error": "TTS engine not available"}), 500
+    
+    try:
+        return jsonify(run_synthesis_batch(request.get_json()))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Batch TTS generation failed: {e}")
+        return jsonify({"error": str(e)}), 500
+
 # Anki Integration Endpoints
 
 @app.route('/anki/test', methods=['GET'])
 def test_anki():
     """Test Anki Connect connection with detailed diagnostics"""
     try:
-        # Test basic connection
-        version = anki_request("version")
-        
-        # Test additional functionality
-        decks = anki_request("deckNames")
-        note_types = anki_request("modelNames")
-        media_folder = get_anki_media_folder()
+        # Test connection and additional functionality in one round trip
+        version, decks, note_types, media_folder = anki_multi(
+            ("version", None),
+            ("deckNames", None),
+            ("modelNames", None),
+            ("getMediaDirPath", None)
+        )
+        for outcome in (version, decks, note_types):
+            if outcome["error"]:
+                raise Exception(outcome["error"])
+        version, decks, note_types = version["result"], decks["result"], note_types["result"]
+        media_folder = set_anki_media_folder(media_folder)
         
         return jsonify({
             "success": True,
@@ -214,7 +1949,7 @@ def test_anki():
 def get_decks():
     """Get available Anki decks with error handling"""
     try:
-        decks = anki_request("deckNames")
+        decks = anki_metadata.get("deckNames")
         if not decks:
             decks = ["Default"]  # Fallback
         return jsonify(decks)
@@ -227,7 +1962,7 @@ def get_decks():
 def get_note_types():
     """Get available note types with error handling"""
     try:
-        note_types = anki_request("modelNames")
+        note_types = anki_metadata.get("modelNames")
         if not note_types:
             note_types = ["Basic", "English Vocabulary"]  # Fallback
         return jsonify(note_types)
@@ -240,7 +1975,7 @@ def get_note_types():
 def get_fields(note_type):
     """Get fields for a note type with enhanced error handling and smart defaults"""
     try:
-        fields = anki_request("modelFieldNames", modelName=note_type)
+        fields = anki_metadata.get("modelFieldNames", modelName=note_type)
         
         if not fields or len(fields) == 0:
             # Return smart defaults based on note type name
@@ -255,6 +1990,17 @@ def get_fields(note_type):
         fields = get_default_fields_for_note_type(note_type)
         return jsonify(fields)
 
+@app.route('/anki/cache/invalidate', methods=['POST'])
+def invalidate_anki_cache():
+    """Drop cached deck/note type/field metadata so the next request refetches it"""
+    data = request.get_json(silent=True) or {}
+    actions = data.get('actions', [])
+    if not isinstance(actions, list) or not all(isinstance(action, str) for action in actions):
+        return jsonify({"success": False, "error": "actions must be a list of action names"}), 400
+    anki_metadata.invalidate(*actions)
+    logger.info(f"Anki metadata cache invalidated: {', '.join(actions) or 'all'}")
+    return jsonify({"success": True, "invalidated": actions or "all"})
+
 def get_default_fields_for_note_type(note_type):
     """Get default fields based on note type name pattern"""
     note_type_lower = note_type.lower()
@@ -272,169 +2018,812 @@ def get_default_fields_for_note_type(note_type):
         # Basic and other simple note types
         return ['Front', 'Back']
 
-@app.route('/anki/add-note', methods=['POST'])
-def add_note():
-    """Add note to Anki with enhanced audio support and debugging"""
+# Audio index settings
+AUDIO_EXTENSIONS = {'.mp3', '.wav', '.ogg', '.opus', '.m4a', '.flac'}
+AUDIO_INDEX_MAX_DEPTH = int(os.environ.get('AUDIO_INDEX_MAX_DEPTH', '3'))
+AUDIO_INDEX_REFRESH_INTERVAL = float(os.environ.get('AUDIO_INDEX_REFRESH_INTERVAL', '30'))
+AUDIO_INDEX_MISS_REFRESH_INTERVAL = float(os.environ.get('AUDIO_INDEX_MISS_REFRESH_INTERVAL', '2'))
+
+class AudioIndex:
+    """In-memory filename -> paths index of audio files, refreshed by directory mtime"""
+
+    def __init__(self, max_depth, refresh_interval, miss_refresh_interval):
+        self.max_depth = max_depth
+        self.refresh_interval = refresh_interval
+        self.miss_refresh_interval = miss_refresh_interval
+        self.roots = {}  # root dir -> max depth
+        self.dirs = {}  # dir -> (mtime_ns, depth left, filenames, subdirs)
+        self.files = {}  # filename -> set of full paths
+        self.lock = threading.RLock()
+        self.built = False
+        self.build_seconds = None
+        self.last_refresh = None
+        self.refreshes = 0
+
+    def default_roots(self):
+        """Locations the service has always searched for vault audio"""
+        current_dir = Path.cwd()
+        script_dir = Path(__file__).resolve().parent
+        roots = {current_dir: self.max_depth, current_dir.parent: self.max_depth}
+        for audio_dir in (
+            Path.home() / "Documents" / "Obsidian Vault" / "Audio",
+            Path.home() / "Desktop" / "Obsidian" / "Audio",
+            script_dir / "Audio",
+            script_dir.parent / "Audio",
+            Path("D:/") / "Python" / "LLM_anki" / "Audio",
+            Path("C:/") / "Users" / Path.home().name / "Documents" / "Audio",
+        ):
+            roots.setdefault(audio_dir, 0)
+        return roots
+
+    def build(self):
+        """Scan all roots from scratch"""
+        started = time.perf_counter()
+        with self.lock:
+            self.dirs.clear()
+            self.files.clear()
+            for root, depth in {**self.default_roots(), **self.roots}.items():
+                self.roots[root] = max(depth, self.roots.get(root, 0))
+            for root, depth in self.roots.items():
+                self._scan(str(root), depth)
+            self.built = True
+            self.build_seconds = time.perf_counter() - started
+            self.last_refresh = time.time()
+        logger.info(f"Audio index built: {len(self.files)} files in {len(self.dirs)} directories ({self.build_seconds:.2f}s)")
+
+    def _ensure_built(self):
+        if not self.built:
+            with self.lock:
+                if not self.built:
+                    self.build()
+
+    def add_root(self, path, max_depth=0):
+        """Index another directory (e.g. a vault's Audio folder) if not already covered"""
+        root = Path(path)
+        self._ensure_built()
+        with self.lock:
+            if str(root) in self.dirs or self.roots.get(root, -1) >= max_depth:
+                return
+            self.roots[root] = max_depth
+            self._scan(str(root), max_depth)
+
+    def _scan(self, directory, depth):
+        """(Re)list one directory and recurse into new subdirectories"""
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+            entries = list(os.scandir(directory))
+        except OSError:
+            self._forget(directory)
+            return
+        
+        previous = self.dirs.get(directory)
+        old_files = previous[2] if previous else set()
+        old_subdirs = previous[3] if previous else set()
+        
+        filenames = set()
+        subdirs = set()
+        for entry in entries:
+            try:
+                if entry.is_file() and os.path.splitext(entry.name)[1].lower() in AUDIO_EXTENSIONS:
+                    filenames.add(entry.name)
+                elif depth > 0 and entry.is_dir() and not entry.name.startswith('.'):
+                    subdirs.add(entry.path)
+            except OSError:
+                continue
+        
+        self.dirs[directory] = (mtime_ns, depth, filenames, subdirs)
+        for name in old_files - filenames:
+            self._unlink(name, os.path.join(directory, name))
+        for name in filenames - old_files:
+            self.files.setdefault(name, set()).add(os.path.join(directory, name))
+        for subdir in old_subdirs - subdirs:
+            self._forget(subdir)
+        for subdir in subdirs - old_subdirs:
+            if subdir not in self.dirs:
+                self._scan(subdir, depth - 1)
+
+    def _unlink(self, name, path):
+        paths = self.files.get(name)
+        if paths:
+            paths.discard(path)
+            if not paths:
+                del self.files[name]
+
+    def _forget(self, directory):
+        entry = self.dirs.pop(directory, None)
+        if entry:
+            for name in entry[2]:
+                self._unlink(name, os.path.join(directory, name))
+            for subdir in entry[3]:
+                self._forget(subdir)
+
+    def refresh(self):
+        """Rescan only directories whose mtime changed since they were listed"""
+        self._ensure_built()
+        with self.lock:
+            for directory, (mtime_ns, depth, _, _) in list(self.dirs.items()):
+                if directory not in self.dirs:
+                    continue  # Dropped while refreshing a parent
+                try:
+                    changed = os.stat(directory).st_mtime_ns != mtime_ns
+                except OSError:
+                    changed = True
+                if changed:
+                    self._scan(directory, depth)
+            for root, depth in self.roots.items():
+                if str(root) not in self.dirs:
+                    self._scan(str(root), depth)  # Root created since the last scan
+            self.last_refresh = time.time()
+            self.refreshes += 1
+
+    def lookup(self, filename):
+        """All indexed paths for a filename, refreshing when due or (rate-limited) on a miss"""
+        self._ensure_built()
+        if self.last_refresh is None or time.time() - self.last_refresh > self.refresh_interval:
+            self.refresh()
+        
+        with self.lock:
+            paths = [Path(p) for p in sorted(self.files.get(filename, ()))]
+        if not paths or not all(path.exists() for path in paths):
+            # Missing files are the common case for check-audio; don't rescan for each one
+            if time.time() - self.last_refresh < self.miss_refresh_interval:
+                return [path for path in paths if path.exists()]
+            self.refresh()
+            with self.lock:
+                paths = [Path(p) for p in sorted(self.files.get(filename, ()))]
+        return paths
+
+    def listing(self, directory):
+        """Indexed audio files directly inside a directory, as {filename: path}"""
+        self._ensure_built()
+        with self.lock:
+            entry = self.dirs.get(str(directory))
+            if entry is None:
+                return {}
+            return {name: Path(directory) / name for name in entry[2]}
+
+    def audio_folders(self):
+        """Indexed directories named Audio, the plugin's vault audio folders"""
+        self._ensure_built()
+        with self.lock:
+            return [directory for directory in self.dirs if Path(directory).name == "Audio"]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "built": self.built,
+                "files": sum(len(paths) for paths in self.files.values()),
+                "directories": len(self.dirs),
+                "roots": [str(root) for root in self.roots],
+                "build_ms": round(self.build_seconds * 1000, 1) if self.build_seconds is not None else None,
+                "last_refresh": self.last_refresh,
+                "refreshes": self.refreshes
+            }
+
+audio_index = AudioIndex(AUDIO_INDEX_MAX_DEPTH, AUDIO_INDEX_REFRESH_INTERVAL, AUDIO_INDEX_MISS_REFRESH_INTERVAL)
+
+def resolve_audio_source(filename, vault_path=None, obsidian_path=None, audio_folders_only=False):
+    """Find a vault audio file worth copying (over 1KB).
+    
+    Explicit paths from the plugin are tried first, then the audio index,
+    preferring matches inside the given vault. With audio_folders_only
+    (field references) only files in folders named Audio count.
+    Returns (path, candidates).
+    """
+    candidates = []
+    if vault_path:
+        candidates.append(Path(vault_path) / "Audio" / filename)
+    if obsidian_path:
+        # Direct path, then vault + obsidian path
+        candidates.append(Path(obsidian_path))
+        if vault_path:
+            candidates.append(Path(vault_path) / obsidian_path)
+    
+    if vault_path:
+        audio_index.add_root(Path(vault_path) / "Audio")
+    indexed = audio_index.lookup(filename)
+    # Media folders may sit under a search root; never treat any Anki profile's copy as the source
+    indexed = [
+        path for path in indexed
+        if path.parent.name != "collection.media" and not (ANKI_MEDIA_FOLDER and path.parent == Path(ANKI_MEDIA_FOLDER))
+    ]
+    if audio_folders_only:
+        indexed = [path for path in indexed if path.parent.name == "Audio"]
+    if vault_path:
+        indexed.sort(key=lambda path: not str(path).startswith(str(Path(vault_path))))
+    candidates.extend(path for path in indexed if path not in candidates)
+    
+    for path in candidates:
+        try:
+            if path.is_file() and path.stat().st_size > 1000:
+                logger.info(f"Found audio file at: {path}")
+                return path, candidates
+        except OSError:
+            continue
+    return None, candidates
+
+# Media transfer settings
+MEDIA_LINK_MODE = os.environ.get('MEDIA_LINK_MODE', 'auto')  # auto, reflink, hardlink or copy
+COPY_BUFFER_SIZE = 1024 * 1024
+HASH_CACHE_SIZE = 10000
+FICLONE = 0x40049409  # Linux ioctl that shares extents between files (btrfs, xfs)
+
+_hash_cache = OrderedDict()  # (path, size, mtime_ns) -> sha256 hex digest
+_hash_cache_lock = threading.Lock()
+
+def file_digest(path, stat=None):
+    """SHA-256 of a file, remembered until its size or mtime changes"""
+    stat = stat or os.stat(path)
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_cache_lock:
+        if key in _hash_cache:
+            _hash_cache.move_to_end(key)
+            return _hash_cache[key]
+    
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(COPY_BUFFER_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    
+    with _hash_cache_lock:
+        _hash_cache[key] = digest.hexdigest()
+        while len(_hash_cache) > HASH_CACHE_SIZE:
+            _hash_cache.popitem(last=False)
+    return digest.hexdigest()
+
+def same_content(source, dest, source_stat=None, dest_stat=None):
+    """True when dest already holds exactly the bytes of source"""
+    source_stat = source_stat or os.stat(source)
+    dest_stat = dest_stat or os.stat(dest)
+    if (source_stat.st_dev, source_stat.st_ino) == (dest_stat.st_dev, dest_stat.st_ino):
+        return True  # Already linked
+    return source_stat.st_size == dest_stat.st_size and file_digest(source, source_stat) == file_digest(dest, dest_stat)
+
+def _reflink(source, temp_path):
+    import fcntl
+    with open(source, 'rb') as src, open(temp_path, 'wb') as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+
+def _streamed_copy(source, temp_path):
+    with open(source, 'rb') as src, open(temp_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+    shutil.copystat(source, temp_path)
+
+def transfer_media(source, dest, link_root=None):
+    """Make dest hold source's audio as cheaply as possible.
+    
+    Skips identical files, then tries a reflink, or a hardlink when source
+    lies inside link_root (the vault's Audio folder), when both sides share
+    a filesystem, and falls back to a streamed copy. The new file is moved
+    into place atomically. Returns {"method", "size"}.
+    """
+    source, dest = Path(source), Path(dest)
+    source_stat = source.stat()
+    try:
+        dest_stat = dest.stat()
+    except FileNotFoundError:
+        dest_stat = None
+    
+    if dest_stat and same_content(source, dest, source_stat, dest_stat):
+        return {"method": "skipped", "size": dest_stat.st_size}
+    
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    same_device = source_stat.st_dev == dest.parent.stat().st_dev
+    if MEDIA_LINK_MODE == 'auto':
+        methods = ['reflink', 'hardlink', 'copy'] if same_device else ['copy']
+    else:
+        methods = [MEDIA_LINK_MODE, 'copy'] if MEDIA_LINK_MODE != 'copy' else ['copy']
+    if 'hardlink' in methods and not (link_root and source.resolve().is_relative_to(Path(link_root).resolve())):
+        methods.remove('hardlink')  # A hardlink ties Anki's copy to the source file
+    
+    temp_path = dest.with_name(f".{dest.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        for method in methods:
+            try:
+                if method == 'reflink':
+                    if sys.platform != 'linux':
+                        continue
+                    _reflink(source, temp_path)
+                elif method == 'hardlink':
+                    os.link(source, temp_path)
+                else:
+                    _streamed_copy(source, temp_path)
+                break
+            except OSError as e:
+                # Unsupported by this filesystem; try the next method
+                if method == 'copy':
+                    raise
+                logger.debug(f"{method} failed for {source}: {e}")
+                if temp_path.exists():
+                    temp_path.unlink()
+        os.replace(temp_path, dest)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+    
+    return {"method": method, "size": source_stat.st_size}
+
+# Bulk import settings
+ANKI_ADD_NOTES_CHUNK = int(os.environ.get('ANKI_ADD_NOTES_CHUNK', '50'))
+MEDIA_COPY_WORKERS = int(os.environ.get('MEDIA_COPY_WORKERS', '8'))
+SOUND_REFERENCE = re.compile(r'\[sound:([^\]]+)\]')
+
+def copy_note_media(fields, existing_audio_files, vault_path, media_folder):
+    """Copy a note's audio files into the Anki media folder.
+    
+    Returns (copied_files, failed_files) for the response.
+    """
+    copied_files = []
+    failed_files = []
+    vault_audio = Path(vault_path) / "Audio" if vault_path else None
+    
+    # Handle existing audio files with enhanced path resolution
+    if existing_audio_files:
+        for field_name, audio_info in existing_audio_files.items():
+            try:
+                filename = audio_info.get('filename')
+                obsidian_path = audio_info.get('obsidianPath')
+                
+                if not filename:
+                    continue
+                    
+                logger.info(f"Processing audio file: {filename}")
+                
+                # Enhanced path resolution
+                with metrics.phase('resolve'):
+                    source_path, possible_paths = resolve_audio_source(filename, vault_path, obsidian_path)
+                
+                if source_path:
+                    dest_path = Path(media_folder) / filename
+                    
+                    # Copy file (skipped when identical, linked when possible)
+                    with metrics.phase('copy'):
+                        transfer = transfer_media(source_path, dest_path, link_root=vault_audio)
+                    
+                    # Verify copy
+                    if transfer["size"] > 1000:
+                        copied_files.append({
+                            "filename": filename,
+                            "source": str(source_path),
+                            "size": transfer["size"],
+                            "method": transfer["method"]
+                        })
+                        logger.info(f"Successfully copied: {filename} ({transfer['size']} bytes, {transfer['method']})")
+                    else:
+                        failed_files.append(f"{filename} (copy verification failed)")
+                else:
+                    failed_files.append(f"{filename} (not found in {len(possible_paths)} locations)")
+                    logger.error(f"Audio file not found: {filename}")
+                    logger.error(f"Searched paths: {[str(p) for p in possible_paths[:5]]}")
+                    
+            except Exception as e:
+                failed_files.append(f"{filename} (error: {str(e)})")
+                logger.error(f"Failed to process audio file {filename}: {e}")
+    
+    # Extract and copy audio files from [sound:filename] format in fields
+    for field_name, field_value in fields.items():
+        if isinstance(field_value, str) and '[sound:' in field_value:
+            sound_matches = SOUND_REFERENCE.findall(field_value)
+            
+            for sound_filename in sound_matches:
+                if sound_filename not in [af.get('filename') for af in existing_audio_files.values()]:
+                    # This is a new audio file mentioned in fields
+                    try:
+                        # Search for this file
+                        with metrics.phase('resolve'):
+                            source_audio_path, _ = resolve_audio_source(sound_filename, vault_path, audio_folders_only=True)
+                        
+                        dest_audio_path = Path(media_folder) / sound_filename
+                        if source_audio_path and not dest_audio_path.exists():
+                            with metrics.phase('copy'):
+                                transfer = transfer_media(source_audio_path, dest_audio_path, link_root=vault_audio)
+                            if transfer["method"] != "skipped":
+                                copied_files.append({
+                                    "filename": sound_filename,
+                                    "source": str(source_audio_path),
+                                    "size": transfer["size"],
+                                    "method": transfer["method"]
+                                })
+                                logger.info(f"Copied field audio: {sound_filename} ({transfer['method']})")
+                        elif not source_audio_path:
+                            failed_files.append(f"{sound_filename} (field reference not found)")
+                            
+                    except Exception as e:
+                        failed_files.append(f"{sound_filename} (field error: {str(e)})")
+    
+    return copied_files, failed_files
+
+def create_note(data):
+    """Copy a note's audio into Anki's media folder and add the note"""
+    deck = data.get('deck')
+    note_type = data.get('noteType')
+    fields = data.get('fields', {})
+    tags = data.get('tags', [])
+    existing_audio_files = data.get('existingAudioFiles', {})
+    vault_path = data.get('vaultPath', '')
+    
+    logger.info(f"Creating Anki note with {len(existing_audio_files)} audio files")
+    logger.info(f"Vault path: {vault_path}")
+    
+    # Get Anki media folder
+    with metrics.phase('resolve'):
+        media_folder = get_anki_media_folder()
+    
+    if not media_folder:
+        logger.error("Cannot get Anki media folder")
+        raise Exception("Cannot access Anki media folder")
+    
+    copied_files, failed_files = copy_note_media(fields, existing_audio_files, vault_path, media_folder)
+    
+    # Create the note
+    with metrics.phase('anki'):
+        note_id = anki_request("addNote", note={
+            "deckName": deck,
+            "modelName": note_type,
+            "fields": fields,
+            "tags": tags
+        })
+    anki_metadata.invalidate()
+    forget_note_ids()
+    
+    return {
+        "success": True,
+        "noteId": note_id,
+        "media_folder": media_folder,
+        "copied_files": copied_files,
+        "failed_files": failed_files,
+        "total_copied": len(copied_files),
+        "total_failed": len(failed_files)
+    }
+
+@app.route('/anki/add-note', methods=['POST'])
+def add_note():
+    """Add note to Anki with enhanced audio support and debugging"""
+    try:
+        return jsonify(create_note(request.get_json()))
+        
+    except Exception as e:
+        logger.error(f"Failed to add note: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+def add_anki_notes(anki_notes):
+    """Submit notes through addNotes in chunks.
+    
+    Returns one (note_id, error) pair per note, in order.
+    """
+    outcomes = []
+    for start in range(0, len(anki_notes), ANKI_ADD_NOTES_CHUNK):
+        chunk = anki_notes[start:start + ANKI_ADD_NOTES_CHUNK]
+        try:
+            note_ids = anki_request("addNotes", notes=chunk)
+            outcomes.extend(
+                (note_id, None if note_id else "Note was not added (duplicate or invalid fields)")
+                for note_id in note_ids
+            )
+        except AnkiError as e:
+            # Newer AnkiConnect rejects the whole chunk if any note fails; retry per note to find out which
+            logger.warning(f"addNotes chunk failed ({e}), retrying notes individually")
+            try:
+                results = anki_multi(*[("addNote", {"note": note}) for note in chunk])
+                outcomes.extend((result["result"], result["error"]) for result in results)
+            except Exception as e:
+                outcomes.extend((None, str(e)) for _ in chunk)
+        except Exception as e:
+            # Unavailable, timed out or garbled: Anki may have added the chunk, so resending could duplicate it
+            outcomes.extend((None, str(e)) for _ in chunk)
+    return outcomes
+
+def create_notes(data, progress=None):
+    """Copy media for many notes in parallel, then add them in addNotes chunks.
+    
+    Raises ValueError when no notes are given; progress(done, total) is
+    called as each note's media is copied.
+    """
+    notes = data.get('notes', [])
+    vault_path = data.get('vaultPath', '')
+    
+    if not notes:
+        raise ValueError("No notes provided")
+    
+    logger.info(f"Creating {len(notes)} Anki notes")
+    
+    media_folder = get_anki_media_folder()
+    if not media_folder:
+        logger.error("Cannot get Anki media folder")
+        raise Exception("Cannot access Anki media folder")
+    
+    def copy_media(note):
+        return copy_note_media(
+            note.get('fields', {}),
+            note.get('existingAudioFiles', {}),
+            note.get('vaultPath', vault_path),
+            media_folder
+        )
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(MEDIA_COPY_WORKERS, len(notes)))) as executor:
+        futures = [executor.submit(copy_media, note) for note in notes]
+        media_results = []
+        for future in futures:
+            media_results.append(future.result())
+            if progress:
+                progress(len(media_results), len(notes))
+    
+    with metrics.phase('anki'):
+        outcomes = add_anki_notes([
+            {
+                "deckName": note.get('deck', data.get('deck')),
+                "modelName": note.get('noteType', data.get('noteType')),
+                "fields": note.get('fields', {}),
+                "tags": note.get('tags', data.get('tags', []))
+            }
+            for note in notes
+        ])
+    anki_metadata.invalidate()
+    forget_note_ids()
+    
+    results = []
+    for index, (note, (copied_files, failed_files), (note_id, error)) in enumerate(zip(notes, media_results, outcomes)):
+        results.append({
+            "id": note.get('id', index),
+            "success": error is None,
+            "noteId": note_id,
+            "error": error,
+            "copied_files": copied_files,
+            "failed_files": failed_files
+        })
+    
+    added = sum(1 for result in results if result["success"])
+    logger.info(f"Added {added}/{len(results)} Anki notes")
+    return {
+        "success": added == len(results),
+        "results": results,
+        "media_folder": media_folder,
+        "total": len(results),
+        "total_added": added,
+        "total_failed": len(results) - added
+    }
+
+@app.route('/anki/add-notes', methods=['POST'])
+def add_notes():
+    """Add many notes at once: media is copied in parallel, notes are added in chunks"""
+    try:
+        return jsonify(create_notes(request.get_json()))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Failed to add notes: {e}")
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+# Note management settings
+ANKI_NOTES_BATCH = int(os.environ.get('ANKI_NOTES_BATCH', '100'))  # Notes per notesInfo / update request
+ANKI_BROWSE_PAGE_SIZE = 100
+ANKI_BROWSE_MAX_PAGE_SIZE = 1000
+ANKI_BROWSE_IDS_TTL = float(os.environ.get('ANKI_BROWSE_IDS_TTL', '60'))  # Seconds a query's note IDs serve later pages
+ANKI_BROWSE_IDS_CACHE_SIZE = 16
+
+_note_ids_cache = OrderedDict()  # query -> (fetched at, sorted note IDs)
+_note_ids_lock = threading.Lock()
+
+def forget_note_ids():
+    """Drop cached findNotes results after notes are added or deleted"""
+    with _note_ids_lock:
+        _note_ids_cache.clear()
+
+def find_note_ids(query, refresh=False):
+    """Sorted note IDs matching a search, reused across the pages of one listing"""
+    with _note_ids_lock:
+        cached = _note_ids_cache.get(query)
+        if cached and not refresh and time.time() - cached[0] < ANKI_BROWSE_IDS_TTL:
+            _note_ids_cache.move_to_end(query)
+            return cached[1]
+    
+    note_ids = sorted(anki_request("findNotes", query=query))
+    with _note_ids_lock:
+        _note_ids_cache[query] = (time.time(), note_ids)
+        while len(_note_ids_cache) > ANKI_BROWSE_IDS_CACHE_SIZE:
+            _note_ids_cache.popitem(last=False)
+    return note_ids
+
+def notes_info(note_ids):
+    """notesInfo for many notes, in ANKI_NOTES_BATCH chunks sent in one multi round trip"""
+    chunks = [note_ids[start:start + ANKI_NOTES_BATCH] for start in range(0, len(note_ids), ANKI_NOTES_BATCH)]
+    if len(chunks) <= 1:
+        return anki_request("notesInfo", notes=note_ids) if note_ids else []
+    
+    notes = []
+    for outcome in anki_multi(*[("notesInfo", {"notes": chunk}) for chunk in chunks]):
+        if outcome["error"]:
+            raise Exception(outcome["error"])
+        notes.extend(outcome["result"])
+    return notes
+
+def parse_note_ids(data):
+    """Note IDs from noteIds (list, single ID or comma-separated string) and/or noteId, as ints"""
+    note_ids = data.get('noteIds')
+    if note_ids is None:
+        note_ids = []
+    elif isinstance(note_ids, str):
+        note_ids = [note_id.strip() for note_id in note_ids.split(',') if note_id.strip()]
+    elif isinstance(note_ids, int) and not isinstance(note_ids, bool):
+        note_ids = [note_ids]
+    elif not isinstance(note_ids, list):
+        raise ValueError("noteIds must be a list, a note ID or a comma-separated string of note IDs")
+    if data.get('noteId') is not None:
+        note_ids = note_ids + [data['noteId']]
+    
+    parsed = []
+    for note_id in note_ids:
+        if isinstance(note_id, bool) or not isinstance(note_id, (int, str)):
+            raise ValueError(f"Invalid note ID: {note_id!r}")
+        try:
+            parsed.append(int(note_id))
+        except ValueError:
+            raise ValueError(f"Invalid note ID: {note_id!r}")
+    return parsed
+
+def update_notes(data):
+    """Update fields (and optionally tags) of one or many notes.
+    
+    Accepts {noteId, fields, tags}, {noteIds, fields, tags} to set the same
+    values on several notes, or {notes: [{noteId, fields, tags}]}. Audio
+    referenced by the new fields is copied like for add-note.
+    """
+    if data.get('notes'):
+        updates = data['notes']
+    else:
+        updates = [
+            {"noteId": note_id, "fields": data.get('fields'), "tags": data.get('tags'),
+             "existingAudioFiles": data.get('existingAudioFiles')}
+            for note_id in parse_note_ids(data)
+        ]
+    if not updates:
+        raise ValueError("No notes to update")
+    
+    actions = []
+    note_ids = []
+    media = []
+    for update in updates:
+        note_id = parse_note_ids(update)
+        fields = update.get('fields') or {}
+        if len(note_id) != 1 or not (fields or update.get('tags') is not None):
+            raise ValueError("Each update needs one noteId and fields or tags")
+        note_ids.append(note_id[0])
+        if fields and (update.get('existingAudioFiles') or any('[sound:' in str(value) for value in fields.values())):
+            media.append(update)
+        if update.get('tags') is not None:
+            actions.append(("updateNote", {"note": {"id": note_id[0], "fields": fields, "tags": update['tags']}}))
+        else:
+            actions.append(("updateNoteFields", {"note": {"id": note_id[0], "fields": fields}}))
+    
+    copied_files, failed_files = [], []
+    if media:
+        media_folder = get_anki_media_folder()
+        if not media_folder:
+            raise Exception("Cannot access Anki media folder")
+        for update in media:
+            copied, failed = copy_note_media(
+                update['fields'], update.get('existingAudioFiles') or {},
+                update.get('vaultPath', data.get('vaultPath', '')), media_folder
+            )
+            copied_files.extend(copied)
+            failed_files.extend(failed)
+    
+    errors = []
+    for start in range(0, len(actions), ANKI_NOTES_BATCH):
+        chunk = actions[start:start + ANKI_NOTES_BATCH]
+        if len(actions) == 1:
+            action, params = chunk[0]
+            anki_request(action, **params)
+            continue
+        for note_id, outcome in zip(note_ids[start:start + ANKI_NOTES_BATCH], anki_multi(*chunk)):
+            if outcome["error"]:
+                errors.append({"noteId": note_id, "error": outcome["error"]})
+    
+    return {
+        "success": not errors,
+        "updated": len(note_ids) - len(errors),
+        "failed": errors,
+        "error": f"{len(errors)} of {len(note_ids)} notes failed to update" if errors else None,
+        "copied_files": copied_files,
+        "failed_files": failed_files
+    }
+
+@app.route('/anki/update-note', methods=['POST'])
+def update_note():
+    """Update one or many notes' fields in a single call"""
     try:
-        data = request.get_json()
-        deck = data.get('deck')
-        note_type = data.get('noteType')
-        fields = data.get('fields', {})
-        tags = data.get('tags', [])
-        existing_audio_files = data.get('existingAudioFiles', {})
-        vault_path = data.get('vaultPath', '')
+        return jsonify(update_notes(request.get_json()))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Failed to update notes: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/anki/delete-note', methods=['POST'])
+def delete_note():
+    """Delete one or many notes in a single deleteNotes call"""
+    try:
+        note_ids = parse_note_ids(request.get_json())
+        if not note_ids:
+            return jsonify({"success": False, "error": "No note IDs provided"}), 400
         
-        logger.info(f"Creating Anki note with {len(existing_audio_files)} audio files")
-        logger.info(f"Vault path: {vault_path}")
+        anki_request("deleteNotes", notes=note_ids)
+        forget_note_ids()
+        logger.info(f"Deleted {len(note_ids)} notes")
+        return jsonify({"success": True, "deleted": len(note_ids), "noteIds": note_ids})
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Failed to delete notes: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/anki/browse', methods=['GET', 'POST'])
+def browse_notes():
+    """Open notes in Anki's browser (noteId/noteIds), or page through notes matching a search.
+    
+    Listing takes query (or deck), limit, cursor and fields; it returns
+    nextCursor until the last page. Cursors are note IDs, so pages stay
+    stable while notes are added.
+    """
+    try:
+        data = {**request.args.to_dict(), **(request.get_json(silent=True) or {})}
         
-        # Get Anki media folder
-        media_folder = get_anki_media_folder()
+        note_ids = parse_note_ids(data)
+        if note_ids:
+            shown = anki_request("guiBrowse", query=' or '.join(f"nid:{note_id}" for note_id in note_ids))
+            return jsonify({"success": True, "noteIds": shown})
         
-        if not media_folder:
-            logger.error("Cannot get Anki media folder")
-            return jsonify({
-                "success": False,
-                "error": "Cannot access Anki media folder"
-            }), 500
+        query = data.get('query') or (f'deck:"{data["deck"]}"' if data.get('deck') else None)
+        if not query:
+            return jsonify({"success": False, "error": "Provide noteId(s) to open, or a query or deck to list"}), 400
+        limit = min(max(1, int(data.get('limit', ANKI_BROWSE_PAGE_SIZE))), ANKI_BROWSE_MAX_PAGE_SIZE)
+        cursor = int(data['cursor']) if data.get('cursor') else None
+        fields = data.get('fields')
+        if isinstance(fields, str):
+            fields = [name for name in fields.split(',') if name]
         
-        copied_files = []
-        failed_files = []
+        # A new listing fetches fresh IDs; later pages reuse them
+        all_ids = find_note_ids(query, refresh=cursor is None)
+        start = bisect.bisect_right(all_ids, cursor) if cursor is not None else 0
+        page_ids = all_ids[start:start + limit]
         
-        # Handle existing audio files with enhanced path resolution
-        if existing_audio_files:
-            for field_name, audio_info in existing_audio_files.items():
-                try:
-                    filename = audio_info.get('filename')
-                    obsidian_path = audio_info.get('obsidianPath')
-                    
-                    if not filename:
-                        continue
-                        
-                    logger.info(f"Processing audio file: {filename}")
-                    
-                    # Enhanced path resolution
-                    possible_paths = []
-                    
-                    # Add vault-based paths if available
-                    if vault_path:
-                        vault_audio_path = Path(vault_path) / "Audio" / filename
-                        possible_paths.append(vault_audio_path)
-                        
-                    if obsidian_path:
-                        # Direct path
-                        possible_paths.append(Path(obsidian_path))
-                        # Vault + obsidian path
-                        if vault_path:
-                            possible_paths.append(Path(vault_path) / obsidian_path)
-                    
-                    # Add current working directory paths
-                    current_dir = Path.cwd()
-                    possible_paths.extend([
-                        current_dir / "Audio" / filename,
-                        current_dir / filename,
-                        current_dir.parent / "Audio" / filename,
-                    ])
-                    
-                    # Find the actual file
-                    source_path = None
-                    for path in possible_paths:
-                        try:
-                            if path.exists() and path.is_file() and path.stat().st_size > 1000:
-                                source_path = path
-                                logger.info(f"Found audio file at: {source_path}")
-                                break
-                        except Exception:
-                            continue
-                    
-                    if source_path:
-                        dest_path = Path(media_folder) / filename
-                        
-                        # Copy file
-                        shutil.copy2(source_path, dest_path)
-                        
-                        # Verify copy
-                        if dest_path.exists() and dest_path.stat().st_size > 1000:
-                            copied_files.append({
-                                "filename": filename,
-                                "source": str(source_path),
-                                "size": dest_path.stat().st_size
-                            })
-                            logger.info(f"Successfully copied: {filename} ({dest_path.stat().st_size} bytes)")
-                        else:
-                            failed_files.append(f"{filename} (copy verification failed)")
-                    else:
-                        failed_files.append(f"{filename} (not found in {len(possible_paths)} locations)")
-                        logger.error(f"Audio file not found: {filename}")
-                        logger.error(f"Searched paths: {[str(p) for p in possible_paths[:5]]}")
-                        
-                except Exception as e:
-                    failed_files.append(f"{filename} (error: {str(e)})")
-                    logger.error(f"Failed to process audio file {filename}: {e}")
-        
-        # Extract and copy audio files from [sound:filename] format in fields
-        for field_name, field_value in fields.items():
-            if isinstance(field_value, str) and '[sound:' in field_value:
-                import re
-                sound_matches = re.findall(r'\[sound:([^\]]+)\]', field_value)
-                
-                for sound_filename in sound_matches:
-                    if sound_filename not in [af.get('filename') for af in existing_audio_files.values()]:
-                        # This is a new audio file mentioned in fields
-                        try:
-                            # Search for this file
-                            search_paths = [
-                                Path(vault_path) / "Audio" / sound_filename if vault_path else None,
-                                Path.cwd() / "Audio" / sound_filename,
-                                Path.cwd().parent / "Audio" / sound_filename,
-                            ]
-                            search_paths = [p for p in search_paths if p is not None]
-                            
-                            source_audio_path = None
-                            for path in search_paths:
-                                if path.exists() and path.stat().st_size > 1000:
-                                    source_audio_path = path
-                                    break
-                            
-                            if source_audio_path:
-                                dest_audio_path = Path(media_folder) / sound_filename
-                                if not dest_audio_path.exists():
-                                    shutil.copy2(source_audio_path, dest_audio_path)
-                                    copied_files.append({
-                                        "filename": sound_filename,
-                                        "source": str(source_audio_path),
-                                        "size": dest_audio_path.stat().st_size
-                                    })
-                                    logger.info(f"Copied field audio: {sound_filename}")
-                            else:
-                                failed_files.append(f"{sound_filename} (field reference not found)")
-                                
-                        except Exception as e:
-                            failed_files.append(f"{sound_filename} (field error: {str(e)})")
-        
-        # Create the note
-        note_id = anki_request("addNote", note={
-            "deckName": deck,
-            "modelName": note_type,
-            "fields": fields,
-            "tags": tags
-        })
+        notes = []
+        for info in notes_info(page_ids):
+            if not info:
+                continue  # Deleted since the IDs were fetched
+            note_fields = {name: value["value"] for name, value in info.get("fields", {}).items()}
+            if fields:
+                note_fields = {name: note_fields[name] for name in fields if name in note_fields}
+            notes.append({
+                "noteId": info["noteId"],
+                "modelName": info.get("modelName"),
+                "tags": info.get("tags", []),
+                "fields": note_fields
+            })
         
+        more = start + limit < len(all_ids)
         return jsonify({
             "success": True,
-            "noteId": note_id,
-            "media_folder": media_folder,
-            "copied_files": copied_files,
-            "failed_files": failed_files,
-            "total_copied": len(copied_files),
-            "total_failed": len(failed_files)
+            "query": query,
+            "notes": notes,
+            "total": len(all_ids),
+            "limit": limit,
+            "nextCursor": str(page_ids[-1]) if more and page_ids else None
         })
-        
+    except ValueError as e:
+        return jsonify({"success": False, "error": f"Invalid parameter: {e}"}), 400
     except Exception as e:
-        logger.error(f"Failed to add note: {e}")
-        return jsonify({
-            "success": False,
-            "error": str(e)
-        }), 500
+        logger.error(f"Failed to browse notes: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
 
 # Add endpoint to manually copy audio files
 @app.route('/anki/copy-audio', methods=['POST'])
@@ -451,79 +2840,20 @@ def copy_audio_to_anki():
         if not media_folder:
             return jsonify({"success": False, "error": "Cannot access Anki media folder"}), 500
         
-        # Enhanced path detection - try multiple possible locations
-        possible_paths = []
-        
-        # Get current working directory and common Obsidian vault locations
+        # Look the file up in the audio index instead of walking the disk
         current_dir = Path.cwd()
-        
-        # Add various possible paths
-        possible_paths.extend([
-            # Current directory and subdirectories
-            current_dir / "Audio" / audio_filename,
-            current_dir / audio_filename,
-            
-            # Parent directories
-            current_dir.parent / "Audio" / audio_filename,
-            current_dir.parent / audio_filename,
-            
-            # Common Obsidian vault locations
-            Path.home() / "Documents" / "Obsidian Vault" / "Audio" / audio_filename,
-            Path.home() / "Desktop" / "Obsidian" / "Audio" / audio_filename,
-            
-            # Plugin directory relative paths
-            Path(__file__).parent / "Audio" / audio_filename,
-            Path(__file__).parent.parent / "Audio" / audio_filename,
-            
-            # Absolute path patterns
-            Path("D:/") / "Python" / "LLM_anki" / "Audio" / audio_filename,
-            Path("C:/") / "Users" / Path.home().name / "Documents" / "Audio" / audio_filename,
-        ])
-        
-        # Also try to find any file with the same name in the system
-        try:
-            # Search in current directory tree
-            for root, dirs, files in os.walk(current_dir):
-                if audio_filename in files:
-                    possible_paths.append(Path(root) / audio_filename)
-                    
-            # Search in parent directory tree (limited depth)
-            parent_search_root = current_dir.parent
-            search_depth = 0
-            for root, dirs, files in os.walk(parent_search_root):
-                if search_depth > 3:  # Limit search depth
-                    break
-                if audio_filename in files:
-                    possible_paths.append(Path(root) / audio_filename)
-                search_depth += 1
-                    
-        except Exception as search_error:
-            logger.warning(f"File search failed: {search_error}")
-        
-        # Try each possible path
-        source_path = None
-        for path in possible_paths:
-            try:
-                if path.exists() and path.is_file():
-                    # Verify it's actually an audio file
-                    if path.stat().st_size > 1000:  # At least 1KB
-                        source_path = path
-                        logger.info(f"Found audio file at: {source_path}")
-                        break
-            except Exception as e:
-                continue
+        source_path, possible_paths = resolve_audio_source(audio_filename, data.get('vaultPath'))
         
         if not source_path:
             # Log all attempted paths for debugging
             logger.error(f"Audio file not found: {audio_filename}")
-            logger.error(f"Searched in {len(possible_paths)} locations:")
-            for i, path in enumerate(possible_paths[:10]):  # Log first 10 paths
-                logger.error(f"  {i+1}. {path} (exists: {path.exists() if hasattr(path, 'exists') else 'unknown'})")
+            searched_paths = [str(p) for p in possible_paths[:10]] or audio_index.stats()["roots"]
+            logger.error(f"Searched in: {searched_paths}")
                 
             return jsonify({
                 "success": False, 
                 "error": f"Audio file not found: {audio_filename}",
-                "searched_paths": [str(p) for p in possible_paths[:10]],
+                "searched_paths": searched_paths,
                 "current_dir": str(current_dir),
                 "suggestions": [
                     "Make sure to click 'Save Note' first to generate audio files",
@@ -539,27 +2869,24 @@ def copy_audio_to_anki():
             # Ensure destination directory exists
             dest_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # Copy the file
-            shutil.copy2(source_path, dest_path)
+            # Copy the file (skipped when identical, linked when possible)
+            vault_path = data.get('vaultPath')
+            transfer = transfer_media(source_path, dest_path, link_root=Path(vault_path) / "Audio" if vault_path else None)
+            file_size = transfer["size"]
             
             # Verify the copy
-            if dest_path.exists():
-                file_size = dest_path.stat().st_size
-                source_size = source_path.stat().st_size
-                
-                if file_size == source_size and file_size > 1000:
-                    logger.info(f"Successfully copied audio: {source_path} -> {dest_path} ({file_size} bytes)")
-                    return jsonify({
-                        "success": True,
-                        "message": f"Audio file copied successfully",
-                        "source": str(source_path),
-                        "destination": str(dest_path),
-                        "size": file_size
-                    })
-                else:
-                    raise Exception(f"File copy verification failed: source={source_size}, dest={file_size}")
+            if file_size > 1000:
+                logger.info(f"Successfully copied audio: {source_path} -> {dest_path} ({file_size} bytes, {transfer['method']})")
+                return jsonify({
+                    "success": True,
+                    "message": f"Audio file copied successfully",
+                    "source": str(source_path),
+                    "destination": str(dest_path),
+                    "size": file_size,
+                    "method": transfer["method"]
+                })
             else:
-                raise Exception("Destination file does not exist after copy")
+                raise Exception(f"File copy verification failed: size={file_size}")
                 
         except Exception as copy_error:
             logger.error(f"Copy operation failed: {copy_error}")
@@ -574,6 +2901,388 @@ def copy_audio_to_anki():
         logger.error(f"Failed to copy audio: {e}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/anki/media/sync', methods=['POST'])
+def sync_media():
+    """Copy vault audio missing from (or different in) the Anki media folder in one pass"""
+    try:
+        data = request.get_json(silent=True) or {}
+        vault_path = data.get('vaultPath', '')
+        filenames = data.get('filenames', [])
+        if not isinstance(filenames, list) or not all(isinstance(name, str) for name in filenames):
+            return jsonify({"success": False, "error": "filenames must be a list of file names"}), 400
+        only = set(filenames)
+        dry_run = data.get('dryRun', False)
+        
+        media_folder = get_anki_media_folder()
+        if not media_folder:
+            return jsonify({"success": False, "error": "Cannot access Anki media folder"}), 500
+        media_dir = Path(media_folder)
+        
+        # Vault side: the vault's Audio folder, or every indexed Audio folder
+        audio_index.refresh()
+        if vault_path:
+            audio_dir = Path(vault_path) / "Audio"
+            audio_index.add_root(audio_dir)
+            audio_dirs = [audio_dir]
+            link_root = audio_dir
+        else:
+            audio_dirs = [Path(d) for d in audio_index.audio_folders() if Path(d) != media_dir]
+            link_root = None
+        vault_files = {}
+        for audio_dir in audio_dirs:
+            for name, path in audio_index.listing(audio_dir).items():
+                vault_files.setdefault(name, path)
+        if only:
+            vault_files = {name: path for name, path in vault_files.items() if name in only}
+        
+        # Anki side: list the media folder directly for sizes, else ask AnkiConnect for names
+        anki_sizes = {}
+        try:
+            with os.scandir(media_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        anki_sizes[entry.name] = entry.stat().st_size
+        except OSError:
+            anki_sizes = {name: None for name in anki_request("getMediaFilesNames", pattern="*")}
+        
+        missing, changed, up_to_date, skipped = [], [], [], []
+        for name, path in sorted(vault_files.items()):
+            try:
+                size = path.stat().st_size
+            except OSError:
+                skipped.append(name)
+                continue
+            if size <= 1000:
+                skipped.append(name)  # Same threshold as single-file copies
+            elif name not in anki_sizes:
+                missing.append(name)
+            elif anki_sizes[name] is not None and (
+                anki_sizes[name] != size or not same_content(path, media_dir / name)
+            ):
+                changed.append(name)
+            else:
+                up_to_date.append(name)
+        
+        copied_files, failed_files = [], []
+        to_copy = missing + changed
+        if to_copy and not dry_run:
+            def copy_one(name):
+                transfer = transfer_media(vault_files[name], media_dir / name, link_root=link_root)
+                return {"filename": name, "source": str(vault_files[name]), **transfer}
+            
+            with ThreadPoolExecutor(max_workers=max(1, min(MEDIA_COPY_WORKERS, len(to_copy)))) as executor:
+                futures = {name: executor.submit(copy_one, name) for name in to_copy}
+                for name, future in futures.items():
+                    try:
+                        copied_files.append(future.result())
+                    except Exception as e:
+                        failed_files.append(f"{name} (error: {str(e)})")
+                        logger.error(f"Failed to sync audio file {name}: {e}")
+        
+        logger.info(f"Media sync: {len(missing)} missing, {len(changed)} changed, {len(copied_files)} copied")
+        return jsonify({
+            "success": not failed_files,
+            "dry_run": dry_run,
+            "media_folder": media_folder,
+            "audio_folders": [str(d) for d in audio_dirs],
+            "vault_files": len(vault_files),
+            "anki_files": len(anki_sizes),
+            "missing": missing,
+            "changed": changed,
+            "skipped": skipped,
+            "total_up_to_date": len(up_to_date),
+            "copied_files": copied_files,
+            "failed_files": failed_files,
+            "total_copied": len(copied_files),
+            "total_failed": len(failed_files)
+        })
+        
+    except Exception as e:
+        logger.error(f"Media sync failed: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+# Media garbage collection settings
+MEDIA_GC_MIN_AGE = float(os.environ.get('MEDIA_GC_MIN_AGE', '3600'))  # Newer files may be waiting for their note
+MEDIA_GC_QUERY = 'deck:*'
+AUDIO_REFERENCE = re.compile(
+    r'[^\s\[\]()|/\\"\'<>:]+(?:' + '|'.join(re.escape(ext) for ext in sorted(AUDIO_EXTENSIONS)) + r')\b',
+    re.IGNORECASE
+)
+LINK_TARGET = re.compile(r'\[\[([^\]|#]+)|\]\(([^)\s]+)')  # ![[Audio/x.mp3]] and [x](Audio/x%20y.mp3)
+
+def markdown_audio_references(text):
+    """Audio filenames a Markdown note embeds or links to"""
+    names = set(AUDIO_REFERENCE.findall(text))
+    for wikilink, link in LINK_TARGET.findall(text):
+        target = wikilink or requests.utils.unquote(link)
+        name = target.strip().replace('\\', '/').rsplit('/', 1)[-1]
+        if Path(name).suffix.lower() in AUDIO_EXTENSIONS:
+            names.add(name)
+    return names
+
+class MediaReferences:
+    """Which audio files notes refer to, kept up to date incrementally between runs.
+    
+    Anki notes are re-read only when new or edited since the last scan;
+    vault Markdown files only when their mtime changes.
+    """
+
+    def __init__(self):
+        self.note_refs = {}  # note ID -> set of [sound:] filenames
+        self.last_scan = None
+        self.markdown_refs = {}  # path -> (mtime_ns, set of audio filenames)
+        self.lock = threading.Lock()
+
+    def refresh_notes(self, full=False):
+        """Sync note references with Anki; returns (total notes, notes read)"""
+        started = time.time()
+        all_ids = set(anki_request("findNotes", query=MEDIA_GC_QUERY))
+        for note_id in set(self.note_refs) - all_ids:
+            del self.note_refs[note_id]
+        
+        to_read = all_ids - set(self.note_refs)
+        if self.last_scan and not full:
+            # edited:N matches notes changed in the last N days
+            days = max(1, int((started - self.last_scan) // 86400) + 1)
+            to_read |= all_ids & set(anki_request("findNotes", query=f"edited:{days}"))
+        else:
+            to_read = all_ids
+        
+        for info in notes_info(sorted(to_read)):
+            if not info:
+                continue
+            self.note_refs[info["noteId"]] = {
+                filename
+                for field in info.get("fields", {}).values()
+                for filename in SOUND_REFERENCE.findall(field.get("value", ""))
+            }
+        self.last_scan = started
+        return len(all_ids), len(to_read)
+
+    def refresh_markdown(self, vault_path):
+        """Audio filenames mentioned in the vault's Markdown notes"""
+        seen = set()
+        referenced = set()
+        for directory, subdirs, files in os.walk(vault_path):
+            subdirs[:] = [name for name in subdirs if not name.startswith('.')]  # .obsidian, .trash
+            for name in files:
+                if not name.endswith('.md'):
+                    continue
+                path = os.path.join(directory, name)
+                seen.add(path)
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                    cached = self.markdown_refs.get(path)
+                    if not cached or cached[0] != mtime:
+                        with open(path, encoding='utf-8', errors='replace') as markdown:
+                            cached = (mtime, markdown_audio_references(markdown.read()))
+                        self.markdown_refs[path] = cached
+                    referenced |= cached[1]
+                except OSError:
+                    continue
+        for path in [path for path in self.markdown_refs if path.startswith(str(vault_path)) and path not in seen]:
+            del self.markdown_refs[path]
+        return referenced
+
+    def notes_by_file(self):
+        references = {}
+        for note_id, filenames in self.note_refs.items():
+            for filename in filenames:
+                references.setdefault(filename, set()).add(note_id)
+        return references
+
+media_references = MediaReferences()
+
+def find_garbage(files, referenced, min_age):
+    """Split {name: path} into unreferenced orphans and groups of identical files"""
+    now = time.time()
+    orphans = []
+    by_size = {}
+    for name, path in sorted(files.items()):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        # Copies keep their source's mtime (copystat, hardlinks); ctime changes when the file lands here
+        age = now - max(stat.st_mtime, stat.st_ctime)
+        if name not in referenced and not name.startswith('_') and age >= min_age:
+            orphans.append({"filename": name, "size": stat.st_size})
+        by_size.setdefault(stat.st_size, []).append((name, path, stat))
+    
+    duplicates = []
+    for size, candidates in by_size.items():
+        if len(candidates) < 2:
+            continue
+        by_digest = {}
+        for name, path, stat in candidates:
+            try:
+                by_digest.setdefault(file_digest(path, stat), []).append(name)
+            except OSError:
+                continue
+        for names in by_digest.values():
+            if len(names) > 1:
+                # Keep a referenced copy when there is one, else the first name
+                keep = min(names, key=lambda name: (name not in referenced, name))
+                duplicates.append({"keep": keep, "copies": sorted(n for n in names if n != keep), "size": size})
+    return orphans, duplicates
+
+def merge_duplicate_media(duplicates, note_files):
+    """Repoint notes from duplicate copies to the kept file.
+    
+    Returns (updated note IDs, errors, [(filename, size)] of copies no note uses any more).
+    """
+    updates = {}  # note ID -> {copy: kept}
+    for group in duplicates:
+        for copy in group["copies"]:
+            for note_id in note_files.get(copy, ()):
+                updates.setdefault(note_id, {})[copy] = group["keep"]
+    
+    actions = []
+    for info in notes_info(sorted(updates)):
+        if not info:
+            continue
+        renames = updates[info["noteId"]]
+        fields = {}
+        for name, field in info.get("fields", {}).items():
+            value = field.get("value", "")
+            new_value = SOUND_REFERENCE.sub(lambda match: f"[sound:{renames.get(match.group(1), match.group(1))}]", value)
+            if new_value != value:
+                fields[name] = new_value
+        if fields:
+            actions.append((info["noteId"], ("updateNoteFields", {"note": {"id": info["noteId"], "fields": fields}})))
+    
+    merged, errors, failed = [], [], set()
+    for start in range(0, len(actions), ANKI_NOTES_BATCH):
+        chunk = actions[start:start + ANKI_NOTES_BATCH]
+        for (note_id, _), outcome in zip(chunk, anki_multi(*[action for _, action in chunk])):
+            if outcome["error"]:
+                errors.append(f"note {note_id}: {outcome['error']}")
+                failed.add(note_id)
+            else:
+                merged.append(note_id)
+                media_references.note_refs.pop(note_id, None)  # Re-read on the next run
+    
+    freed = [
+        (copy, group["size"])
+        for group in duplicates for copy in group["copies"]
+        if note_files.get(copy) and not note_files[copy] & failed
+    ]
+    return merged, errors, freed
+
+def run_media_gc(data, progress=None):
+    """Find audio no note uses, and identical copies, in the Anki media folder and the vault.
+    
+    Dry run by default. Otherwise Anki orphans are deleted through AnkiConnect,
+    vault orphans are moved to the vault's .trash folder, and with
+    mergeDuplicates notes are repointed to one copy before the rest go.
+    """
+    dry_run = data.get('dryRun', True)
+    vault_path = data.get('vaultPath')
+    min_age = float(data.get('minAgeSeconds', MEDIA_GC_MIN_AGE))
+    remove_orphans = data.get('removeOrphans', True)
+    merge_duplicates = data.get('mergeDuplicates', False)
+    
+    media_folder = get_anki_media_folder()
+    if not media_folder:
+        raise Exception("Cannot access Anki media folder")
+    media_dir = Path(media_folder)
+    
+    with media_references.lock:
+        total_notes, notes_read = media_references.refresh_notes(full=data.get('full', False))
+        note_files = media_references.notes_by_file()
+        if progress:
+            progress(1, 3)
+        
+        anki_files = {}
+        with os.scandir(media_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and Path(entry.name).suffix.lower() in AUDIO_EXTENSIONS:
+                    anki_files[entry.name] = Path(entry.path)
+        anki_orphans, anki_duplicates = find_garbage(anki_files, note_files, min_age)
+        
+        vault_report = None
+        vault_files = {}
+        if vault_path:
+            audio_dir = Path(vault_path) / "Audio"
+            audio_index.refresh()
+            audio_index.add_root(audio_dir)
+            vault_files = audio_index.listing(audio_dir)
+            markdown_files = media_references.refresh_markdown(vault_path)
+            vault_orphans, vault_duplicates = find_garbage(vault_files, set(note_files) | markdown_files, min_age)
+            vault_report = {"audio_folder": str(audio_dir), "files": len(vault_files),
+                            "orphans": vault_orphans, "duplicates": vault_duplicates}
+        if progress:
+            progress(2, 3)
+        
+        removed, merged, errors = [], [], []
+        if not dry_run and not total_notes:
+            # An empty result is far more likely a wrong profile or query than an empty collection
+            raise Exception("Anki returned no notes, refusing to remove media (use dryRun to inspect)")
+        if not dry_run:
+            if merge_duplicates and anki_duplicates:
+                merged, merge_errors, freed = merge_duplicate_media(anki_duplicates, note_files)
+                errors += merge_errors
+                # Copies no note points at any more are removed along with the orphans
+                anki_orphans += [{"filename": name, "size": size} for name, size in freed]
+            
+            if remove_orphans:
+                names = sorted({orphan["filename"] for orphan in anki_orphans})
+                for start in range(0, len(names), ANKI_NOTES_BATCH):
+                    chunk = names[start:start + ANKI_NOTES_BATCH]
+                    for name, outcome in zip(chunk, anki_multi(*[("deleteMediaFile", {"filename": name}) for name in chunk])):
+                        if outcome["error"]:
+                            errors.append(f"{name}: {outcome['error']}")
+                        else:
+                            removed.append({"filename": name, "location": "anki"})
+                
+                if vault_report:
+                    trash = Path(vault_path) / ".trash"
+                    for orphan in vault_report["orphans"]:
+                        try:
+                            trash.mkdir(exist_ok=True)
+                            shutil.move(str(vault_files[orphan["filename"]]), str(trash / orphan["filename"]))
+                            removed.append({"filename": orphan["filename"], "location": "vault"})
+                        except OSError as e:
+                            errors.append(f"{orphan['filename']}: {e}")
+                    audio_index.refresh()
+        if progress:
+            progress(3, 3)
+    
+    def reclaimable(report):
+        sizes = {orphan["filename"]: orphan["size"] for orphan in report["orphans"]}
+        sizes.update((copy, group["size"]) for group in report["duplicates"] for copy in group["copies"])
+        return sum(sizes.values())
+    
+    anki_report = {"files": len(anki_files), "orphans": anki_orphans, "duplicates": anki_duplicates}
+    logger.info(
+        f"Media GC ({'dry run' if dry_run else 'applied'}): {len(anki_orphans)} Anki orphans, "
+        f"{len(anki_duplicates)} duplicate groups, read {notes_read}/{total_notes} notes"
+    )
+    return {
+        "success": not errors,
+        "dry_run": dry_run,
+        "media_folder": media_folder,
+        "notes": {"total": total_notes, "read": notes_read},
+        "referenced_files": len(note_files),
+        "anki": anki_report,
+        "vault": vault_report,
+        "bytes_reclaimable": reclaimable(anki_report) + (reclaimable(vault_report) if vault_report else 0),
+        "removed": removed,
+        "merged_notes": merged,
+        "errors": errors
+    }
+
+@app.route('/media/gc', methods=['POST'])
+def media_gc():
+    """Report (dryRun, the default) or remove orphaned and duplicate audio"""
+    try:
+        return jsonify(run_media_gc(request.get_json(silent=True) or {}))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Media GC failed: {e}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
 @app.route('/anki/check-audio/<filename>', methods=['GET'])
 def check_audio_file(filename):
     """Check if audio file exists in various locations with enhanced detection"""
@@ -603,52 +3312,25 @@ def check_audio_file(filename):
             else:
                 locations["anki_media"] = {"exists": False, "path": str(anki_path)}
         
-        # Enhanced search for Obsidian audio files
-        search_paths = [
-            current_dir / "Audio" / filename,
-            current_dir / filename,
-            current_dir.parent / "Audio" / filename,
-            Path(__file__).parent / "Audio" / filename,
-            Path(__file__).parent.parent / "Audio" / filename,
-        ]
-        
-        for path in search_paths:
-            try:
-                if path.exists() and path.is_file():
-                    file_info = {
-                        "path": str(path),
-                        "size": path.stat().st_size,
-                        "exists": True,
-                        "type": "direct_search"
-                    }
-                    locations["obsidian_audio"].append(file_info)
-                    locations["found_paths"].append(file_info)
-            except Exception as e:
-                continue
-        
-        # Directory traversal search (limited)
+        # Look up Obsidian audio files in the audio index
         try:
-            search_roots = [current_dir, current_dir.parent]
-            for root_path in search_roots:
-                for root, dirs, files in os.walk(root_path):
-                    # Limit search depth
-                    depth = len(Path(root).relative_to(root_path).parts)
-                    if depth > 3:
-                        continue
-                        
-                    if filename in files:
-                        file_path = Path(root) / filename
-                        if file_path.stat().st_size > 1000:  # Valid audio file
-                            file_info = {
-                                "path": str(file_path),
-                                "size": file_path.stat().st_size,
-                                "exists": True,
-                                "type": "traversal_search"
-                            }
-                            locations["found_paths"].append(file_info)
-                            
+            for path in audio_index.lookup(filename):
+                try:
+                    size = path.stat().st_size
+                except OSError:
+                    continue
+                file_info = {
+                    "path": str(path),
+                    "size": size,
+                    "exists": True,
+                    "type": "audio_folder" if path.parent.name == "Audio" else "index_search"
+                }
+                if path.parent.name == "Audio":
+                    locations["obsidian_audio"].append(file_info)
+                locations["found_paths"].append(file_info)
         except Exception as search_error:
             locations["search_info"]["search_error"] = str(search_error)
+        locations["search_info"]["audio_index"] = audio_index.stats()
         
         return jsonify({
             "filename": filename,
@@ -660,11 +3342,546 @@ def check_audio_file(filename):
         logger.error(f"Failed to check audio file: {e}")
         return jsonify({"error": str(e)}), 500
 
+def run_prefetch(data, progress=None):
+    """Render texts into the synthesis cache one at a time while the workers are idle.
+    
+    Each render waits for the pool to drain, so interactive requests never queue
+    behind more than one prefetch render, and is followed by a pause that keeps
+    prefetching within TTS_PREFETCH_CPU_BUDGET of one worker.
+    """
+    items = data.get('texts') or data.get('items') or []
+    default_voice = data.get('voice', 'en-us')
+    default_quality = data.get('quality', 'high')
+    default_format = data.get('format', 'wav')
+    default_bitrate = data.get('bitrate')
+    default_backend = data.get('backend')
+    
+    if not items:
+        raise ValueError("No texts provided")
+    if len(items) > TTS_PREFETCH_MAX_ITEMS:
+        raise ValueError(f"Too many texts (max {TTS_PREFETCH_MAX_ITEMS})")
+    if not synthesis_cache.enabled:
+        raise ValueError("Synthesis cache is disabled, prefetched audio would be discarded")
+    
+    rendered = cached = 0
+    errors = []
+    busy_seconds = 0.0
+    for index, item in enumerate(items):
+        if isinstance(item, str):
+            item = {'text': item}
+        text = item.get('text', '')
+        try:
+            if not text:
+                raise ValueError("No text provided")
+            settings = (
+                text, item.get('voice', default_voice), item.get('quality', default_quality),
+                item.get('format', default_format), item.get('bitrate', default_bitrate),
+                item.get('backend', default_backend)
+            )
+            if synthesis_cache.contains(SynthesisJob.settings(*settings)[-1]):
+                cached += 1
+                continue
+            
+            # Yield to interactive work: only render while nothing else is
+            while True:
+                while not synthesis_pool.idle():
+                    time.sleep(TTS_PREFETCH_POLL)
+                try:
+                    job = SynthesisJob(*settings, background=True)
+                    break
+                except SynthesisQueueFull:
+                    time.sleep(TTS_PREFETCH_POLL)
+            
+            started = time.time()
+            job.audio_file().close()
+            elapsed = time.time() - started
+            busy_seconds += elapsed
+            rendered += 1
+            
+            # Duty cycle: rest long enough that rendering stays within the budget
+            time.sleep(elapsed * (1 - TTS_PREFETCH_CPU_BUDGET) / TTS_PREFETCH_CPU_BUDGET)
+        except Exception as e:
+            logger.error(f"Prefetch of {text[:50]!r} failed: {e}")
+            errors.append({"index": index, "text": text, "error": str(e)})
+        finally:
+            if progress:
+                progress(index + 1, len(items))
+    
+    logger.info(f"Prefetch finished: {rendered} rendered, {cached} already cached, {len(errors)} failed")
+    return {
+        "success": not errors,
+        "total": len(items),
+        "rendered": rendered,
+        "cached": cached,
+        "failed": len(errors),
+        "errors": errors,
+        "busy_seconds": round(busy_seconds, 3)
+    }
+
+# Job API settings
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '3'))  # One of these only runs interactive jobs
+JOB_QUEUE_SIZE = int(os.environ.get('JOB_QUEUE_SIZE', '200'))
+JOB_RETENTION = float(os.environ.get('JOB_RETENTION', '900'))  # Seconds finished jobs are kept
+JOB_MAX_RETAINED = int(os.environ.get('JOB_MAX_RETAINED', '200'))  # Finished jobs kept at most
+JOB_MAX_RETAINED_BYTES = int(float(os.environ.get('JOB_MAX_RETAINED_MB', '64')) * 1024 * 1024)
+JOB_SHUTDOWN_TIMEOUT = float(os.environ.get('JOB_SHUTDOWN_TIMEOUT', '30'))  # Seconds running jobs get to finish
+JOB_PRIORITIES = {'interactive': 0, 'normal': 5, 'bulk': 10}  # Lower runs first
+SSE_HEARTBEAT = 15
+
+class JobQueueFull(Exception):
+    """Raised when the job queue has no room for another job"""
+
+class Job:
+    """A unit of background work with progress that clients can poll or subscribe to"""
+
+    def __init__(self, job_type, payload, priority):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.payload = payload
+        self.priority = priority
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = None
+        self.result = None
+        self.error = None
+        self.audio = None  # (bytes, mimetype, download name) for synthesis jobs
+        self.size = 0  # Approximate bytes held by the result
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.version = 0  # Bumped on every change, for event streams
+        self.changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed', 'cancelled')
+
+    def update(self, **changes):
+        with self.changed:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.version += 1
+            self.changed.notify_all()
+
+    def report(self, done, total, message=None):
+        """Progress callback for the job handlers"""
+        self.update(progress=round(done / total, 3) if total else 1.0, message=message or f"{done}/{total}")
+
+    def to_dict(self, include_result=True):
+        info = {
+            "jobId": self.id,
+            "type": self.type,
+            "priority": self.priority,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished
+        }
+        if include_result and self.status == 'done':
+            if self.audio:
+                info["result_url"] = f"/jobs/{self.id}/result"
+                info["size"] = len(self.audio[0])
+            else:
+                info["result"] = self.result
+        return info
+
+class JobManager:
+    """Bounded priority executor for jobs, keeping one worker free for interactive work"""
+
+    def __init__(self, workers, queue_size, retention, max_retained, max_retained_bytes):
+        self.workers = max(2, workers)
+        self.queue_size = queue_size
+        self.retention = retention
+        self.max_retained = max_retained
+        self.max_retained_bytes = max_retained_bytes
+        self.handlers = {}
+        self.jobs = {}
+        self.queue = []  # heap of (priority, sequence, job)
+        self.sequence = itertools.count()
+        self.lock = threading.Condition()
+        self.threads = []
+        self.completed = 0
+        self.failed = 0
+        self.stopping = False
+
+    def handler(self, job_type):
+        """Register the function that runs jobs of a type"""
+        def register(fn):
+            self.handlers[job_type] = fn
+            return fn
+        return register
+
+    def _start(self):
+        if self.threads:
+            return
+        for index in range(self.workers):
+            # Worker 0 is reserved for interactive jobs so bulk work can't starve lookups
+            only_interactive = index == 0
+            thread = threading.Thread(target=self._run, args=(only_interactive,), name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, job_type, payload, priority='normal'):
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type} (use one of {', '.join(self.handlers)})")
+        if isinstance(priority, str):
+            if priority not in JOB_PRIORITIES:
+                raise ValueError(f"Unknown priority: {priority} (use one of {', '.join(JOB_PRIORITIES)})")
+            priority = JOB_PRIORITIES[priority]
+        
+        job = Job(job_type, payload, int(priority))
+        with self.lock:
+            self._cleanup()
+            if self.stopping:
+                raise JobQueueFull("Service is shutting down")
+            if len(self.queue) >= self.queue_size:
+                raise JobQueueFull(f"Job queue full ({self.queue_size} jobs waiting)")
+            self._start()
+            self.jobs[job.id] = job
+            heapq.heappush(self.queue, (job.priority, next(self.sequence), job))
+            self.lock.notify_all()
+        logger.info(f"Queued {job_type} job {job.id} (priority {job.priority})")
+        return job
+
+    def _next_job(self, only_interactive):
+        with self.lock:
+            while True:
+                if self.stopping:
+                    return None
+                if self.queue and (not only_interactive or self.queue[0][0] <= JOB_PRIORITIES['interactive']):
+                    return heapq.heappop(self.queue)[2]
+                self.lock.wait()
+
+    def _run(self, only_interactive):
+        while True:
+            job = self._next_job(only_interactive)
+            if job is None:
+                return
+            if job.status == 'cancelled':
+                continue
+            job.update(status='running', started=time.time())
+            try:
+                result = self.handlers[job.type](job, job.payload)
+                size = len(job.audio[0]) if job.audio else len(json.dumps(result, default=str))
+                job.update(status='done', progress=1.0, result=result, size=size, finished=time.time())
+                with self.lock:
+                    self.completed += 1
+                    self._cleanup()
+            except Exception as e:
+                logger.error(f"{job.type} job {job.id} failed: {e}")
+                job.update(status='failed', error=str(e), finished=time.time())
+                with self.lock:
+                    self.failed += 1
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job that has not started yet"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status != 'queued':
+                return False
+            job.update(status='cancelled', finished=time.time())
+            self.queue = [entry for entry in self.queue if entry[2] is not job]
+            heapq.heapify(self.queue)
+            return True
+
+    def list(self):
+        with self.lock:
+            self._cleanup()
+            return sorted(self.jobs.values(), key=lambda job: job.created)
+
+    def _cleanup(self):
+        """Drop finished jobs past their retention, oldest first, then until within the count and byte caps"""
+        cutoff = time.time() - self.retention
+        finished = sorted((job for job in self.jobs.values() if job.done), key=lambda job: job.finished)
+        retained_bytes = sum(job.size for job in finished)
+        for index, job in enumerate(finished):
+            if job.finished >= cutoff and len(finished) - index <= self.max_retained and retained_bytes <= self.max_retained_bytes:
+                break
+            del self.jobs[job.id]
+            retained_bytes -= job.size
+
+    def shutdown(self, timeout):
+        """Cancel queued jobs and give running ones up to timeout seconds to finish"""
+        with self.lock:
+            self.stopping = True
+            for _, _, job in self.queue:
+                job.update(status='cancelled', finished=time.time())
+            self.queue = []
+            self.lock.notify_all()
+        deadline = time.time() + timeout
+        for thread in self.threads:
+            thread.join(max(0, deadline - time.time()))
+        with self.lock:
+            running = [job.id for job in self.jobs.values() if job.status == 'running']
+        if running:
+            logger.warning(f"Jobs still running at shutdown: {', '.join(running)}")
+
+    def stats(self):
+        with self.lock:
+            return {
+                "workers": self.workers,
+                "queued": len(self.queue),
+                "running": sum(1 for job in self.jobs.values() if job.status == 'running'),
+                "completed": self.completed,
+                "failed": self.failed
+            }
+
+job_manager = JobManager(JOB_WORKERS, JOB_QUEUE_SIZE, JOB_RETENTION, JOB_MAX_RETAINED, JOB_MAX_RETAINED_BYTES)
+
+@job_manager.handler('synthesize')
+def run_synthesize_job(job, payload):
+    if not tts_engine.available():
+        raise Exception("TTS engine not available")
+    if not payload.get('text'):
+        raise ValueError("No text provided")
+    background = job.priority > JOB_PRIORITIES['interactive']
+    while True:
+        try:
+            synthesis = SynthesisJob(
+                payload['text'], payload.get('voice', 'en-us'), payload.get('quality', 'high'),
+                payload.get('format', 'wav'), payload.get('bitrate'), payload.get('backend'),
+                background=background
+            )
+            break
+        except SynthesisQueueFull:
+            if not background:
+                raise
+            time.sleep(TTS_PREFETCH_POLL)
+    job.audio = (synthesis.audio_bytes(), synthesis.mimetype, synthesis.download_name)
+    return {"format": synthesis.format, "backend": synthesis.backend, "cached": synthesis.cached}
+
+@job_manager.handler('synthesize-batch')
+def run_synthesize_batch_job(job, payload):
+    if not tts_engine.available():
+        raise Exception("TTS engine not available")
+    return run_synthesis_batch(payload, job.report, background=job.priority > JOB_PRIORITIES['interactive'])
+
+@job_manager.handler('add-note')
+def run_add_note_job(job, payload):
+    return create_note(payload)
+
+@job_manager.handler('add-notes')
+def run_add_notes_job(job, payload):
+    return create_notes(payload, job.report)
+
+@job_manager.handler('media-gc')
+def run_media_gc_job(job, payload):
+    return run_media_gc(payload, job.report)
+
+@job_manager.handler('prefetch')
+def run_prefetch_job(job, payload):
+    if not tts_engine.available():
+        raise Exception("TTS engine not available")
+    return run_prefetch(payload, job.report)
+
+@app.route('/synthesize/prefetch', methods=['POST'])
+def prefetch_synthesis():
+    """Queue texts to be rendered into the cache in the background at bulk priority"""
+    if not tts_engine.available():
+        return jsonify({"error": "TTS engine not available"}), 500
+    
+    try:
+        data = request.get_json()
+        texts = data.get('texts') or data.get('items') or []
+        if not texts:
+            return jsonify({"error": "No texts provided"}), 400
+        if len(texts) > TTS_PREFETCH_MAX_ITEMS:
+            return jsonify({"error": f"Too many texts (max {TTS_PREFETCH_MAX_ITEMS})"}), 400
+        if not synthesis_cache.enabled:
+            return jsonify({"error": "Synthesis cache is disabled"}), 400
+        
+        job = job_manager.submit('prefetch', data, 'bulk')
+        response = jsonify({**job.to_dict(), "status_url": f"/jobs/{job.id}", "events_url": f"/jobs/{job.id}/events"})
+        return response, 202
+    except JobQueueFull as e:
+        logger.warning(f"Prefetch rejected: {e}")
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Failed to queue prefetch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a long-running job and return its ID immediately"""
+    try:
+        data = request.get_json()
+        job = job_manager.submit(data.get('type'), data.get('payload', {}), data.get('priority', 'normal'))
+        response = jsonify({**job.to_dict(), "status_url": f"/jobs/{job.id}", "events_url": f"/jobs/{job.id}/events"})
+        return response, 202
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except JobQueueFull as e:
+        logger.warning(f"Job rejected: {e}")
+        return jsonify({"error": str(e)}), 503
+    except Exception as e:
+        logger.error(f"Failed to submit job: {e}")
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """List known jobs without their results"""
+    return jsonify({
+        "jobs": [job.to_dict(include_result=False) for job in job_manager.list()],
+        **job_manager.stats()
+    })
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status, plus the result once it is done"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """Cancel a queued job"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if not job_manager.cancel(job_id):
+        return jsonify({"success": False, "error": f"Job is {job.status}"}), 409
+    return jsonify({"success": True})
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """Fetch a finished job's audio (synthesis) or JSON result"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if job.status != 'done':
+        return jsonify({"error": f"Job is {job.status}", "status": job.status}), 409
+    if job.audio:
+        audio_data, mimetype, download_name = job.audio
+        return send_file(io.BytesIO(audio_data), mimetype=mimetype, as_attachment=True, download_name=download_name)
+    return jsonify(job.result)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events with the job's progress until it finishes"""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    def events():
+        version = -1
+        while True:
+            # Never yield while holding the lock: a slow client would stall Job.update()
+            with job.changed:
+                if job.version == version:
+                    job.changed.wait(SSE_HEARTBEAT)
+                changed = job.version != version
+                if changed:
+                    version = job.version
+                    snapshot = job.to_dict()
+            if not changed:
+                yield ": keep-alive\n\n"
+                continue
+            finished = snapshot["status"] in ('done', 'failed', 'cancelled')
+            yield f"event: {snapshot['status'] if finished else 'progress'}\ndata: {json.dumps(snapshot)}\n\n"
+            if finished:
+                return
+    
+    response = Response(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+def parse_args(argv=None):
+    """Command line options for serving"""
+    import argparse
+    parser = argparse.ArgumentParser(description="LLM Dictionary TTS service with Anki integration")
+    parser.add_argument('--host', default='0.0.0.0', help="Interface to bind (default: 0.0.0.0)")
+    parser.add_argument('--port', type=int, default=6789, help="Port to listen on (default: 6789)")
+    parser.add_argument('--server', choices=['auto', 'waitress', 'dev'], default='auto',
+                        help="waitress (production WSGI server), dev (Flask development server), "
+                             "or auto: waitress when installed (default)")
+    parser.add_argument('--threads', type=int, default=8, help="Request handler threads (waitress, default: 8)")
+    parser.add_argument('--connection-limit', type=int, default=100,
+                        help="Maximum simultaneous connections (waitress, default: 100)")
+    parser.add_argument('--keep-alive', type=int, default=120,
+                        help="Seconds an idle keep-alive connection stays open (waitress, default: 120)")
+    parser.add_argument('--max-request-mb', type=float, default=16,
+                        help="Largest accepted request body in MB (default: 16)")
+    return parser.parse_args(argv)
+
+def shutdown_service():
+    """Stop background workers once the server has stopped accepting requests"""
+    logger.info("Waiting for running jobs")
+    job_manager.shutdown(JOB_SHUTDOWN_TIMEOUT)
+    logger.info("Shutting down synthesis workers")
+    synthesis_pool.shutdown()
+
+def serve(args):
+    """Run the app under the selected server until interrupted"""
+    max_request_bytes = int(args.max_request_mb * 1024 * 1024)
+    app.config['MAX_CONTENT_LENGTH'] = max_request_bytes
+    
+    server = args.server
+    if server in ('auto', 'waitress'):
+        try:
+            import waitress
+        except ImportError:
+            if server == 'waitress':
+                raise SystemExit("waitress is not installed: pip install waitress")
+            logger.warning("waitress not installed, falling back to the Flask development server")
+            server = 'dev'
+        else:
+            server = 'waitress'
+    
+    # SIGTERM should stop the server the same way Ctrl+C does (once)
+    import signal
+    def handle_sigterm(signum, frame):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
+    try:
+        if server == 'waitress':
+            # All handler threads share this process's synthesis pool, caches and AnkiConnect session
+            logger.info(f"Serving with waitress ({args.threads} threads)")
+            wsgi_server = waitress.create_server(
+                app,
+                host=args.host,
+                port=args.port,
+                threads=args.threads,
+                connection_limit=args.connection_limit,
+                channel_timeout=args.keep_alive,
+                max_request_body_size=max_request_bytes,
+                ident="llm-dictionary-tts"
+            )
+            # On SIGINT/SIGTERM run() gives running handlers up to 5s to finish, cancels queued
+            # ones and returns; responses still buffered for slow clients are not flushed
+            wsgi_server.run()
+        else:
+            logger.info("Serving with the Flask development server")
+            app.run(host=args.host, port=args.port, debug=False, threaded=True)
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        shutdown_service()
+
 if __name__ == '__main__':
+    args = parse_args()
+    
     print("🎙️ LLM Dictionary TTS Service with Anki Integration")
-    print("📡 Starting server on http://localhost:6789")
+    print(f"📡 Starting server on http://localhost:{args.port}")
     print("🃏 Make sure Anki is running with AnkiConnect addon")
     print("🎵 Audio files will be automatically managed")
     print("---")
     
-    app.run(host='0.0.0.0', port=6789, debug=False)
\ No newline at end of file
+    # Warm the engine and workers in the background so the port opens right away
+    tts_engine.start()
+    health_monitor.start()
+    
+    # Build the audio index in the background so the first lookup is instant
+    threading.Thread(target=audio_index.build, daemon=True).start()
+    
+    serve(args)